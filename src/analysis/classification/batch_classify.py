@@ -0,0 +1,377 @@
+"""
+Offline classification through the OpenAI Batch API.
+
+For large, non-urgent runs every classification request is written to a
+JSONL file and submitted as a batch instead of one synchronous call per
+site. Progress lives in a state file so a restarted process can pick up
+polling where it left off (`classify_website.py --resume-batch STATE`).
+Sites whose batch failed or expired without answering them are
+resubmitted in a new batch, up to CLASSIFY_BATCH_RESUBMITS times.
+
+The client is whatever OpenAI client the caller passes in. Run
+`python3 batch_classify.py` to exercise the whole flow (upload, submit,
+poll, collect, resume) against a local fake Files/Batches server; the same
+server can back classify_website.py --batch through OPENAI_BASE_URL.
+"""
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from verdict import VerdictError, failed_verdict, parse_verdict
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# The Batch API caps input files at 200 MB and 50,000 requests; stay below both
+MAX_BATCH_BYTES = 180 * 1024 * 1024
+MAX_BATCH_REQUESTS = 50000
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+RESUBMITS = int(os.getenv("CLASSIFY_BATCH_RESUBMITS", "2"))
+
+
+def save_state(state, state_file):
+    tmp = state_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, state_file)
+
+
+def load_state(state_file):
+    with open(state_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def new_state(run, work_dir):
+    return {
+        "run": run,
+        "work_dir": work_dir,
+        "created_at": datetime.now().isoformat(),
+        "contacts": [],     # every contact of the run, in custom_id order (site-1, site-2, ...)
+        "captured": False,  # set once every contact has been captured
+        "items": {},        # custom_id -> {"contact", "screenshot_file", "detail", "estimate", "verdict"}
+        "batches": [],      # [{"input_file", "input_file_id", "batch_id", "status", ...}]
+    }
+
+
+def write_batch_files(state, batch_requests, body_params):
+    """Write (custom_id, messages) requests to one or more JSONL batch input files."""
+    part = None
+    size = count = 0
+    handle = None
+    try:
+        for custom_id, messages in batch_requests:
+            line = json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": dict(body_params, messages=messages),
+            }) + "\n"
+            encoded = line.encode("utf-8")
+            if handle is None or size + len(encoded) > MAX_BATCH_BYTES or count >= MAX_BATCH_REQUESTS:
+                if handle:
+                    handle.close()
+                part = os.path.join(state["work_dir"], f"batch_{state['run']}_{len(state['batches']) + 1}.jsonl")
+                handle = open(part, "wb")
+                state["batches"].append({"input_file": part, "status": "prepared", "requests": 0})
+                size = count = 0
+            handle.write(encoded)
+            size += len(encoded)
+            count += 1
+            state["batches"][-1]["requests"] += 1
+    finally:
+        if handle:
+            handle.close()
+
+
+def submit_batches(client, state, state_file):
+    """Upload and submit every batch part that has not been submitted yet."""
+    for batch in state["batches"]:
+        if batch.get("batch_id"):
+            continue
+        if not batch.get("input_file_id"):
+            with open(batch["input_file"], "rb") as f:
+                uploaded = client.files.create(file=f, purpose="batch")
+            batch["input_file_id"] = uploaded.id
+            save_state(state, state_file)
+        submitted = client.batches.create(
+            input_file_id=batch["input_file_id"],
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+            metadata={"run": state["run"]},
+        )
+        batch["batch_id"] = submitted.id
+        batch["status"] = submitted.status
+        save_state(state, state_file)
+        logger.info(f"Submitted batch {submitted.id} ({batch['requests']} requests)")
+
+
+def poll_batches(client, state, state_file, poll_interval=60):
+    """Block until every submitted batch reaches a terminal status."""
+    while True:
+        pending = [b for b in state["batches"] if b.get("status") not in TERMINAL_STATUSES]
+        for batch in pending:
+            remote = client.batches.retrieve(batch["batch_id"])
+            counts = getattr(remote, "request_counts", None)
+            if remote.status != batch["status"]:
+                logger.info(f"Batch {batch['batch_id']}: {batch['status']} -> {remote.status}")
+            batch["status"] = remote.status
+            batch["output_file_id"] = getattr(remote, "output_file_id", None)
+            batch["error_file_id"] = getattr(remote, "error_file_id", None)
+            if counts is not None:
+                batch["request_counts"] = {
+                    "completed": counts.completed, "failed": counts.failed, "total": counts.total
+                }
+        save_state(state, state_file)
+        if all(b.get("status") in TERMINAL_STATUSES for b in state["batches"]):
+            return
+        time.sleep(poll_interval)
+
+
+def _read_file_lines(client, file_id):
+    if not file_id:
+        return []
+    content = client.files.content(file_id)
+    return [json.loads(line) for line in content.text.splitlines() if line.strip()]
+
+
+def collect_results(client, state, state_file):
+    """Map batch output lines back onto state items (sets item['verdict']).
+
+    Returns the custom_ids that are still without a verdict because their
+    batch never answered them (it failed, expired or was cancelled).
+    """
+    for batch in state["batches"]:
+        if batch.get("collected"):
+            continue
+        answered = 0
+        for line in _read_file_lines(client, batch.get("output_file_id")) + _read_file_lines(client, batch.get("error_file_id")):
+            item = state["items"].get(line.get("custom_id"))
+            if item is None or item.get("verdict"):
+                continue
+            answered += 1
+            response = line.get("response") or {}
+            body = response.get("body") or {}
+            if response.get("status_code") == 200 and body.get("choices"):
+                item["usage"] = body.get("usage")
+                try:
+                    item["verdict"] = parse_verdict(body["choices"][0]["message"]["content"])
+                except VerdictError as e:
+                    item["verdict"] = failed_verdict(f"Analysis failed: invalid verdict ({e})")
+            else:
+                error = line.get("error") or body.get("error") or {}
+                message = error.get("message") if isinstance(error, dict) else str(error)
+                item["verdict"] = failed_verdict(f"Analysis failed: {message or 'batch request failed'}")
+        if answered < batch["requests"]:
+            logger.warning(f"Batch {batch['batch_id']} ended {batch['status']}: "
+                           f"{batch['requests'] - answered} of {batch['requests']} requests got no response")
+        batch["collected"] = True
+
+    save_state(state, state_file)
+    return [custom_id for custom_id, item in state["items"].items() if not item.get("verdict")]
+
+
+def complete_batches(client, state, state_file, write_input, poll_interval=60, resubmits=RESUBMITS):
+    """Submit, poll and collect, resubmitting sites no batch answered.
+
+    `write_input(state)` writes new batch parts for every item without a
+    verdict. Returns the custom_ids still unanswered after `resubmits` tries.
+    """
+    for attempt in range(resubmits + 1):
+        if attempt:
+            logger.warning(f"Resubmitting {len(unanswered)} sites that got no batch response "
+                           f"(attempt {attempt + 1} of {resubmits + 1})")
+            write_input(state)
+            save_state(state, state_file)
+        submit_batches(client, state, state_file)
+        poll_batches(client, state, state_file, poll_interval=poll_interval)
+        unanswered = collect_results(client, state, state_file)
+        if not unanswered:
+            break
+    return unanswered
+
+
+def _fake_server(verdict="not good", fail_ids=(), polls_until_done=2, expire_batches=0):
+    """Local Files and Batches endpoints that answer every request with `verdict`.
+
+    Requests whose custom_id is in `fail_ids` go to the error file instead.
+    The first `expire_batches` batches expire without answering anything.
+    """
+    import re
+    import threading
+    import uuid
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    files, batches = {}, {}
+    scores = {name: 5 for name in (
+        "visual_design", "layout_structure", "navigation_accessibility", "interactivity_engagement",
+        "modern_trends", "conversion_optimization", "mobile_optimization", "ux_performance",
+    )}
+    answer = json.dumps({"verdict": verdict, "scores": scores, "summary": ["fake"], "priority_fixes": []})
+    expired = []
+
+    def run_batch(batch):
+        if len(expired) < expire_batches:
+            expired.append(batch["id"])
+            batch["status"] = "expired"
+            return
+        output, errors = [], []
+        for line in files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            if request["custom_id"] in fail_ids:
+                errors.append({"custom_id": request["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "fake failure"}})
+                continue
+            output.append({"custom_id": request["custom_id"], "error": None, "response": {
+                "status_code": 200,
+                "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": answer}}],
+                         "usage": {"prompt_tokens": 1000, "completion_tokens": 100, "total_tokens": 1100}},
+            }})
+        for key, lines in (("output_file_id", output), ("error_file_id", errors)):
+            if lines:
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                files[file_id] = "\n".join(json.dumps(line) for line in lines).encode("utf-8")
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["request_counts"] = {"completed": len(output), "failed": len(errors),
+                                   "total": len(output) + len(errors)}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, body, status=200, content_type="application/json"):
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path.endswith("/files"):
+                # Multipart upload: keep the content of the part that carries a filename
+                boundary = self.headers["Content-Type"].split("boundary=")[1].strip('"').encode()
+                part = next(p for p in data.split(b"--" + boundary) if b"filename=" in p)
+                content = part.split(b"\r\n\r\n", 1)[1].rsplit(b"\r\n", 1)[0]
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                files[file_id] = content
+                return self._reply({"id": file_id, "object": "file", "bytes": len(content), "created_at": 0,
+                                    "filename": "input.jsonl", "purpose": "batch", "status": "processed"})
+            if self.path.endswith("/batches"):
+                body = json.loads(data)
+                batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+                batches[batch_id] = {"id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                                     "input_file_id": body["input_file_id"], "completion_window": "24h",
+                                     "status": "validating", "created_at": 0, "polls": 0}
+                return self._reply({k: v for k, v in batches[batch_id].items() if k != "polls"})
+            self._reply({"error": {"message": "not found"}}, status=404)
+
+        def do_GET(self):
+            match = re.search(r"/batches/([^/]+)$", self.path)
+            if match and match.group(1) in batches:
+                batch = batches[match.group(1)]
+                batch["polls"] += 1
+                if batch["status"] == "validating":
+                    batch["status"] = "in_progress"
+                elif batch["status"] == "in_progress" and batch["polls"] >= polls_until_done:
+                    run_batch(batch)
+                return self._reply({k: v for k, v in batch.items() if k != "polls"})
+            match = re.search(r"/files/([^/]+)/content$", self.path)
+            if match and match.group(1) in files:
+                return self._reply(files[match.group(1)], content_type="application/octet-stream")
+            self._reply({"error": {"message": "not found"}}, status=404)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _self_check(sites=5):
+    """Run a small batch end to end against the fake server, including a resume mid-poll."""
+    import tempfile
+    from openai import OpenAI
+
+    server = _fake_server(fail_ids={"site-2"})
+    client = OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    failures = []
+
+    def check(name, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            state_file = os.path.join(work_dir, "batch_check.json")
+            state = new_state("check", work_dir)
+            for i in range(1, sites + 1):
+                state["items"][f"site-{i}"] = {"contact": {"website": f"https://site{i}.example"}, "verdict": None}
+            write_batch_files(state, ((custom_id, [{"role": "user", "content": "hi"}])
+                                      for custom_id in state["items"]), {"model": "gpt-4o"})
+            save_state(state, state_file)
+            check(f"{sites} requests written to {len(state['batches'])} input file(s)",
+                  sum(b["requests"] for b in state["batches"]) == sites)
+
+            submit_batches(client, state, state_file)
+            check("batch submitted", all(b.get("batch_id") for b in state["batches"]))
+
+            # A restarted process picks the run up from the state file alone
+            state = load_state(state_file)
+            submit_batches(client, state, state_file)
+            poll_batches(client, state, state_file, poll_interval=0.01)
+            collect_results(client, state, state_file)
+            verdicts = {custom_id: item["verdict"] for custom_id, item in load_state(state_file)["items"].items()}
+            check("resumed run collected a verdict for every site", all(verdicts.values()))
+            check("failed request recorded as a failed verdict", "error" in verdicts["site-2"])
+            check("other sites parsed", all(v["verdict"] == "not good" and "error" not in v
+                                            for k, v in verdicts.items() if k != "site-2"))
+    finally:
+        server.shutdown()
+
+    # The first batch of each run below expires unanswered: its sites get no failed verdict
+    # and are sent out again
+    server = _fake_server(expire_batches=2)
+    client = OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+
+    def write_input(state):
+        write_batch_files(state, ((custom_id, [{"role": "user", "content": "hi"}])
+                                  for custom_id, item in state["items"].items() if not item.get("verdict")),
+                          {"model": "gpt-4o"})
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            state_file = os.path.join(work_dir, "batch_check.json")
+            state = new_state("check", work_dir)
+            for i in range(1, sites + 1):
+                state["items"][f"site-{i}"] = {"contact": {"website": f"https://site{i}.example"}, "verdict": None}
+            write_input(state)
+            submit_batches(client, state, state_file)
+            poll_batches(client, state, state_file, poll_interval=0.01)
+            unanswered = collect_results(client, state, state_file)
+            check("expired batch leaves its sites without a verdict",
+                  len(unanswered) == sites and not any(item["verdict"] for item in state["items"].values()))
+
+            state = new_state("check", work_dir)
+            for i in range(1, sites + 1):
+                state["items"][f"site-{i}"] = {"contact": {"website": f"https://site{i}.example"}, "verdict": None}
+            write_input(state)
+            unanswered = complete_batches(client, state, state_file, write_input, poll_interval=0.01)
+            verdicts = [item["verdict"] for item in load_state(state_file)["items"].values()]
+            check(f"unanswered sites resubmitted and answered in {len(state['batches'])} batches",
+                  not unanswered and len(state["batches"]) == 2
+                  and all(v and "error" not in v for v in verdicts))
+    finally:
+        server.shutdown()
+    return not failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if _self_check() else 1)
@@ -0,0 +1,228 @@
+"""
+Two-tier model cascade for classification.
+
+A cheap model looks at low-detail screenshots first and reports how
+confident it is in its verdict. Confident verdicts are kept. The rest,
+and any first pass that failed, are re-judged by the full model
+(CLASSIFICATION_MODEL) at full detail. Most small-business sites are
+clear-cut, so most of them never reach the expensive model.
+
+The screening model, its image detail and the confidence threshold come
+from CASCADE_SCREEN_MODEL, CASCADE_SCREEN_DETAIL and
+CASCADE_CONFIDENCE_THRESHOLD, or from the matching classify_website.py
+flags.
+
+`evaluate` runs both tiers on every site of a labeled sample. For each
+candidate threshold it reports the escalation rate, agreement with the
+labels and with the full model, missed leads, and cost per site:
+
+  python3 cascade.py evaluate labels.csv [--thresholds 0.6,0.7,0.8,0.9]
+  python3 cascade.py evaluate --replay cascade_eval_<timestamp>.json
+
+labels.csv needs a website column and a label column ('good' or
+'not good'). The per-site answers are saved, so --replay can try other
+thresholds without new API calls.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCREEN_MODEL = os.getenv("CASCADE_SCREEN_MODEL", "gpt-4o-mini")
+SCREEN_DETAIL = os.getenv("CASCADE_SCREEN_DETAIL", "low")
+CONFIDENCE_THRESHOLD = float(os.getenv("CASCADE_CONFIDENCE_THRESHOLD", "0.8"))
+DEFAULT_EVAL_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+# Appended to the system prompt of the first pass
+SCREENING_PROMPT = (
+    "\n\nAlso include \"confidence\": a number from 0 to 1 saying how sure you are of the verdict. "
+    "Use a low value when the screenshots are ambiguous, partly loaded, or too small to judge the "
+    "criteria properly."
+)
+
+
+class Cascade:
+    """Cascade settings plus escalation counts for the run summary."""
+
+    def __init__(self, model=SCREEN_MODEL, detail=SCREEN_DETAIL, threshold=CONFIDENCE_THRESHOLD):
+        self.model = model
+        self.detail = detail
+        self.threshold = threshold
+        self.screened = self.escalated = self.failed = 0
+        self._lock = threading.Lock()
+
+    def needs_escalation(self, verdict):
+        """True if a first-pass verdict failed or is below the confidence threshold."""
+        return bool(verdict.get("error")) or verdict.get("confidence", 0.0) < self.threshold
+
+    def record(self, verdict, escalated):
+        with self._lock:
+            self.screened += 1
+            self.escalated += escalated
+            self.failed += bool(verdict.get("error"))
+
+    def summary(self):
+        with self._lock:
+            if not self.screened:
+                return ["  cascade: no sites screened"]
+            return [
+                f"  cascade: {self.escalated}/{self.screened} sites escalated to the full model "
+                f"({self.escalated / self.screened:.0%}; {self.failed} failed first passes), "
+                f"{self.model} at {self.detail} detail, confidence threshold {self.threshold:g}"
+            ]
+
+
+def normalize_label(value):
+    value = (value or "").strip().lower()
+    if not value:
+        return None
+    return "not good" if "not good" in value or value in ("bad", "lead", "0", "no") else "good"
+
+
+def load_labels(path):
+    """[(website, label)] from a CSV with a website column and a label (or verdict) column."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {name.lower(): name for name in reader.fieldnames or []}
+        website_col = columns.get("website")
+        label_col = columns.get("label") or columns.get("verdict")
+        if not website_col or not label_col:
+            raise ValueError(f"{path} needs a 'website' column and a 'label' column")
+        samples = []
+        for row in reader:
+            label = normalize_label(row[label_col])
+            if row[website_col].strip() and label:
+                samples.append((row[website_col].strip(), label))
+    return samples
+
+
+def evaluate(samples, thresholds):
+    """Score the cascade at each threshold from per-site answers of both tiers.
+
+    Each sample has "label", "screen" and "full" verdicts and the "screen_cost"
+    and "full_cost" of producing them. Returns one row per threshold.
+    """
+    rows = []
+    total = len(samples)
+    if not total:
+        return rows
+    full_cost = sum(s["full_cost"] for s in samples) / total
+    leads = sum(1 for s in samples if s["label"] == "not good")
+    for threshold in thresholds:
+        cascade = Cascade(threshold=threshold)
+        escalated = agree_label = agree_full = missed = 0
+        cost = 0.0
+        for s in samples:
+            escalate = cascade.needs_escalation(s["screen"])
+            final = s["full"] if escalate else s["screen"]
+            escalated += escalate
+            agree_label += final["verdict"] == s["label"]
+            agree_full += final["verdict"] == s["full"]["verdict"]
+            missed += s["label"] == "not good" and final["verdict"] == "good"
+            cost += s["screen_cost"] + (s["full_cost"] if escalate else 0.0)
+        rows.append({
+            "threshold": threshold,
+            "escalation_rate": escalated / total,
+            "label_agreement": agree_label / total,
+            "full_agreement": agree_full / total,
+            "missed_leads": missed,
+            "leads": leads,
+            "cost_per_site": cost / total,
+            "full_cost_per_site": full_cost,
+        })
+    return rows
+
+
+def baseline(samples):
+    """Label agreement of each tier on its own."""
+    total = len(samples) or 1
+    return {
+        tier: sum(1 for s in samples if s[tier]["verdict"] == s["label"]) / total
+        for tier in ("screen", "full")
+    }
+
+
+def collect_samples(labels, cascade, limit=None):
+    """Capture each labeled site and classify it with both tiers."""
+    # Imported here: classify_website needs OPENAI_API_KEY and imports this module
+    import classify_website
+
+    samples = []
+    for i, (website, label) in enumerate(labels[:limit], start=1):
+        logger.info(f"Evaluating {i}/{len(labels[:limit])}: {website}")
+        capture, failure = classify_website.capture_and_encode(website)
+        if failure:
+            logger.warning(f"Skipping {website}: {failure['error']}")
+            continue
+        spent = classify_website.cost_tracker.local_spent()
+        screen = classify_website.screen_capture(capture, cascade)
+        screen_cost = classify_website.cost_tracker.local_spent() - spent
+        full = classify_website.request_verdict(classify_website.build_messages(capture["images"]))
+        full_cost = classify_website.cost_tracker.local_spent() - spent - screen_cost
+        samples.append({
+            "website": website,
+            "label": label,
+            "screen": screen,
+            "full": full,
+            "screen_cost": screen_cost,
+            "full_cost": full_cost,
+        })
+    return samples
+
+
+def print_evaluation(samples, thresholds, screen_model):
+    rows = evaluate(samples, thresholds)
+    if not rows:
+        print("No samples to evaluate")
+        return
+    tiers = baseline(samples)
+    print(f"{len(samples)} labeled sites; label agreement {screen_model} alone {tiers['screen']:.1%}, "
+          f"full model alone {tiers['full']:.1%}")
+    print(f"{'threshold':>9}  {'escalated':>9}  {'vs labels':>9}  {'vs full':>8}  {'missed leads':>12}  "
+          f"{'$/site':>8}  {'sites/$ gain':>12}")
+    for row in rows:
+        gain = row["full_cost_per_site"] / row["cost_per_site"] if row["cost_per_site"] else float("inf")
+        print(f"{row['threshold']:>9g}  {row['escalation_rate']:>9.1%}  {row['label_agreement']:>9.1%}  "
+              f"{row['full_agreement']:>8.1%}  {row['missed_leads']:>5}/{row['leads']:<6}  "
+              f"{row['cost_per_site']:>8.4f}  {gain:>11.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the classification cascade on a labeled sample")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ev = sub.add_parser("evaluate", help="run both tiers on labeled sites and compare thresholds")
+    ev.add_argument("labels", nargs="?", help="CSV with website and label columns")
+    ev.add_argument("--replay", metavar="JSON", help="re-score answers saved by an earlier evaluation")
+    ev.add_argument("--limit", type=int, help="evaluate only the first N labeled sites")
+    ev.add_argument("--thresholds", default=",".join(f"{t:g}" for t in DEFAULT_EVAL_THRESHOLDS),
+                    help="comma-separated confidence thresholds to compare (default: %(default)s)")
+    ev.add_argument("--screen-model", default=SCREEN_MODEL)
+    ev.add_argument("--screen-detail", default=SCREEN_DETAIL, choices=["low", "high", "auto"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    thresholds = [float(t) for t in args.thresholds.split(",") if t.strip()]
+    if args.replay:
+        with open(args.replay, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        samples, screen_model = saved["samples"], saved["screen_model"]
+    elif args.labels:
+        cascade = Cascade(args.screen_model, args.screen_detail)
+        samples, screen_model = collect_samples(load_labels(args.labels), cascade, args.limit), args.screen_model
+        out_file = f"cascade_eval_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        with open(out_file, "w", encoding="utf-8") as f:
+            json.dump({"screen_model": screen_model, "screen_detail": args.screen_detail, "samples": samples},
+                      f, indent=2)
+        print(f"Saved per-site answers to {out_file}")
+    else:
+        parser.error("give a labels CSV or --replay")
+    print_evaluation(samples, thresholds, screen_model)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,20 @@
 import os
 import base64
 import requests
-import csv
 import logging
 import time
 from datetime import datetime
 from dotenv import load_dotenv
-from screenshot_capture import capture_screenshot
-from apollo import get_contacts_from_apollo
+from screenshot_capture import capture_screenshot, mobile_screenshot_path
+from verdict import (RESPONSE_FORMAT, SCREENING_RESPONSE_FORMAT, VerdictError, as_verdict, failed_verdict,
+                     parse_verdict)
+from reports import write_reports
+from results_store import ResultsStore
+from costs import CostTracker, image_tokens, png_size, token_cost
+from screenshot_store import ScreenshotStore, image_mime
+from hedging import DEFAULT_MAX_HEDGE_RATIO, DEFAULT_PERCENTILE, HedgedCaller
+from verdict_stream import VerdictStream
+from cascade import CONFIDENCE_THRESHOLD, SCREEN_DETAIL, SCREEN_MODEL, SCREENING_PROMPT, Cascade
 
 # Set up detailed logging
 logging.basicConfig(
@@ -48,162 +55,405 @@ logger.info("API key loaded successfully")
 
 client = OpenAI(api_key=api_key)  # New client initialization
 
+# Replaced per run by start_cost_tracking(); records usage of every API call
+cost_tracker = CostTracker()
+# Where captures are kept; workers may point it elsewhere with --screenshots-dir
+screenshot_store = ScreenshotStore()
+# Set by enable_hedging(); classification calls go through it when hedging is on
+hedger = None
+# Set by enable_streaming(); finishes streamed 'not good' answers in the background
+stream_executor = None
+pending_verdicts = []  # (verdict, future) for answers still streaming
+STREAM_WORKERS = int(os.getenv("CLASSIFY_STREAM_WORKERS", "4"))
+# Set by enable_cascade(); a cheap first pass decides confident sites on its own
+cascade = None
+# Batch runs save their state after this many captures, so a crash loses at most that many
+BATCH_SAVE_EVERY = int(os.getenv("CLASSIFY_BATCH_SAVE_EVERY", "10"))
+
+CLASSIFICATION_MODEL = "gpt-4o"
+CLASSIFICATION_MAX_TOKENS = 1000
+CLASSIFICATION_TEMPERATURE = 0.2
+
+CLASSIFICATION_SYSTEM_PROMPT = (
+    "You are GPT-4o, an expert in evaluating modern business websites for user-centric design, "
+    "visual appeal, and effective UX. You will receive a desktop screenshot of a website, usually "
+    "followed by a screenshot of the same page at phone size, and analyze them "
+    "using the following criteria from 'Modern Business Website Design: Principles for Engagement "
+    "and UX':\n\n"
+    "1. **Visual Design**: Color usage and branding, cohesive palette, typography clarity/hierarchy, "
+    "   use of high-quality/optimized imagery, and sufficient whitespace.\n"
+    "2. **Layout & Structure**: Clear hierarchy of content, grid systems or alignment, effective use "
+    "   of whitespace, logical grouping of elements, and scannability.\n"
+    "3. **Navigation & Accessibility**: Intuitive menus, consistent navigation patterns, adequate "
+    "   color contrast, alt text on images, keyboard-friendly controls, and compliance with basic "
+    "   accessibility practices.\n"
+    "4. **Interactivity & Engagement**: Micro-interactions (hover states, button feedback), subtle "
+    "   animations/transition effects, and purposeful interactive features that enrich the user "
+    "   experience.\n"
+    "5. **Modern Trends**: Thoughtful inclusion of trends like dark mode, glassmorphism, "
+    "   neumorphism, AI personalization, or immersive/3D elements—only if they enhance usability.\n"
+    "6. **Conversion Optimization**: Placement and clarity of CTAs, trust signals (testimonials, "
+    "   security badges), streamlined form design, and overall persuasiveness.\n"
+    "7. **Mobile Optimization**: Fully responsive layout, legible touch targets, well-structured "
+    "   content on small screens, and minimal load times. Judge this from the mobile screenshot "
+    "   when one is provided.\n"
+    "8. **UX Enhancements & Performance**: Fast page loads, intuitive user feedback (loading states, "
+    "   success/error messages), easily digestible content, and continuous improvement signals (e.g., "
+    "   A/B tested elements).\n\n"
+    "After examining the screenshots, you **must** respond with a JSON object containing:\n"
+    "- \"verdict\": exactly 'good' or 'not good'.\n"
+    "- \"scores\": an integer from 1 (poor) to 10 (excellent) for each criterion above, keyed "
+    "  visual_design, layout_structure, navigation_accessibility, interactivity_engagement, "
+    "  modern_trends, conversion_optimization, mobile_optimization and ux_performance.\n"
+    "- \"summary\": bullet points summarizing how well (or poorly) the site meets the above criteria.\n"
+    "- \"priority_fixes\": if the verdict is 'not good', the highest-priority fixes, focused on "
+    "  design, structure, UX, and performance aspects; otherwise an empty list.\n\n"
+    "Your goal is to provide a concise but thorough analysis that references specific design "
+    "principles rather than just general impressions."
+)
+
+CLASSIFICATION_USER_PROMPT = (
+    "Here is a screenshot of a website. Please evaluate it according to the modern business "
+    "web design best practices in your instructions. Then give a final verdict ('good' or "
+    "'not good'), a score for each criterion and bullet points explaining why, as JSON."
+)
+
+CLASSIFICATION_MOBILE_PROMPT = (
+    "Here are two screenshots of the same website from one page load: first at desktop size "
+    "(1280x800), then at phone size (390x844). Please evaluate the site according to the modern "
+    "business web design best practices in your instructions, using the phone screenshot for "
+    "mobile optimization. Then give a final verdict ('good' or 'not good'), a score for each "
+    "criterion and bullet points explaining why, as JSON."
+)
+
+def capture_and_encode(website_url):
+    """Capture the desktop (and, when available, mobile) screenshots, store and base64-encode them.
+
+    Returns (capture, None) on success, where capture holds the stored
+    "screenshot_file" and "mobile_screenshot_file" paths and the encoded
+    "images" as (mime type, base64) pairs, or (None, verdict) with a
+    'not good' verdict describing the failure.
+    """
+    scratch_file = screenshot_store.scratch_path()
+    scratch_mobile = mobile_screenshot_path(scratch_file)
+    try:
+        # Capture screenshot
+        start_time = time.time()
+        logger.info(f"Capturing screenshot of {website_url}")
+        try:
+            capture_screenshot(website_url, scratch_file)
+            logger.info(f"Screenshot capture took {time.time() - start_time:.2f} seconds")
+        except Exception as e:
+            logger.error(f"Screenshot capture failed for {website_url}: {str(e)}")
+            return None, failed_verdict("Unable to capture screenshot")
+
+        if not os.path.exists(scratch_file):
+            error_msg = f"Screenshot file not found: {scratch_file}"
+            logger.error(error_msg)
+            return None, failed_verdict(error_msg)
+
+        # Store and encode images
+        start_time = time.time()
+        try:
+            capture = {
+                "screenshot_file": screenshot_store.put(scratch_file, website_url, "desktop"),
+                "mobile_screenshot_file": None,
+            }
+            if os.path.exists(scratch_mobile):
+                capture["mobile_screenshot_file"] = screenshot_store.put(scratch_mobile, website_url, "mobile")
+            capture["images"] = encode_images(capture)
+            logger.info(f"Image storing and encoding took {time.time() - start_time:.2f} seconds")
+        except Exception as e:
+            logger.error(f"Image encoding failed: {str(e)}")
+            return None, failed_verdict("Failed to process screenshot")
+        return capture, None
+    finally:
+        for path in (scratch_file, scratch_mobile):
+            if os.path.exists(path):
+                os.remove(path)
+
+def encode_images(capture):
+    """(mime type, base64) pairs for the stored desktop and mobile screenshots of a capture."""
+    images = []
+    for image_path in filter(None, [capture["screenshot_file"], capture.get("mobile_screenshot_file")]):
+        with open(image_path, "rb") as image_file:
+            encoded = base64.b64encode(image_file.read()).decode("utf-8")
+        images.append((image_mime(image_path), encoded))
+    return images
+
+def build_messages(images, detail=None, system_prompt=CLASSIFICATION_SYSTEM_PROMPT):
+    """Chat messages asking GPT-4o to classify a site from its desktop (and mobile) screenshots."""
+    image_parts = []
+    for mime, encoded_image in images:
+        image_url = {"url": f"data:{mime};base64,{encoded_image}"}
+        if detail:
+            image_url["detail"] = detail
+        image_parts.append({"type": "image_url", "image_url": image_url})
+    prompt = CLASSIFICATION_MOBILE_PROMPT if len(images) > 1 else CLASSIFICATION_USER_PROMPT
+    return [
+        {
+            "role": "system",
+            "content": system_prompt
+        },
+        {
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": prompt
+                },
+                *image_parts
+            ]
+        }
+    ]
+
+def start_cost_tracking(run, list_name, budget=None):
+    """Account every API call of this process to `run`, persisting usage in the results store."""
+    global cost_tracker
+    cost_tracker = CostTracker(run=run, list_name=list_name, budget=budget, store=ResultsStore())
+    if budget is not None:
+        logger.info(f"Budget for run '{run}': ${budget:.2f}")
+    return cost_tracker
+
+def estimate_prompt_tokens(capture=None, detail=None):
+    """Approximate prompt + image tokens of one classification request.
+
+    Without a capture both views are assumed, at the capture viewport sizes.
+    """
+    prompt_tokens = (len(CLASSIFICATION_SYSTEM_PROMPT) + len(CLASSIFICATION_MOBILE_PROMPT)) // 4
+    if capture is None:
+        sizes = [(1280, 800), (390, 844)]
+    else:
+        # Stored WebP captures have no PNG header; fall back to the capture viewport sizes
+        sizes = [png_size(capture["screenshot_file"]) or (1280, 800)]
+        if capture["mobile_screenshot_file"]:
+            sizes.append(png_size(capture["mobile_screenshot_file"]) or (390, 844))
+    for width, height in sizes:
+        prompt_tokens += image_tokens(width, height, detail or "high")
+    return prompt_tokens
+
+def estimate_request_cost(capture=None, detail=None, batch=False, model=CLASSIFICATION_MODEL):
+    """Worst-case cost of classifying one site: prompt + image tokens and a full-length answer."""
+    prompt_tokens = estimate_prompt_tokens(capture, detail)
+    return token_cost(model, prompt_tokens, CLASSIFICATION_MAX_TOKENS, batch=batch)
+
+def next_site_allowance():
+    """(allowed, detail) for the next site: degrade image detail near the budget, stop once it is spent."""
+    spent = cost_tracker.spent()
+    detail = cost_tracker.image_detail(spent)
+    # Until this process has priced a call, assume the worst case for a site
+    estimate = cost_tracker.average_cost("classify") or estimate_request_cost(detail=detail)
+    if cascade:
+        # Counts every site as escalated, so the budget is never overrun
+        estimate += (cost_tracker.average_cost("screen")
+                     or estimate_request_cost(detail=cascade.detail, model=cascade.model))
+    return cost_tracker.can_queue(estimate, spent), detail
+
+def enable_hedging(percentile=DEFAULT_PERCENTILE, max_hedge_ratio=DEFAULT_MAX_HEDGE_RATIO):
+    """Send a duplicate classification request when one outlasts `percentile` of recent calls."""
+    global hedger
+    from openai import AsyncOpenAI
+    hedger = HedgedCaller(AsyncOpenAI(api_key=api_key), percentile=percentile, max_hedge_ratio=max_hedge_ratio)
+    logger.info(f"Hedging classification calls at p{percentile:g}, at most {max_hedge_ratio:.0%} of calls")
+    return hedger
+
+def enable_streaming(workers=STREAM_WORKERS):
+    """Stream classification answers and decide each site from the verdict and scores alone."""
+    global stream_executor
+    from concurrent.futures import ThreadPoolExecutor
+    stream_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="verdict-stream")
+    logger.info("Streaming verdicts: good sites stop after their scores, not-good answers finish in the background")
+
+def wait_for_verdicts():
+    """Block until every verdict still streaming in the background is complete."""
+    for _, future in pending_verdicts:
+        future.result()
+    pending_verdicts.clear()
+
+def when_verdict_complete(verdict, callback):
+    """Call `callback()` once `verdict` is complete: now, or when its stream finishes."""
+    for pending, future in pending_verdicts:
+        if pending is verdict:
+            future.add_done_callback(lambda _: callback())
+            return
+    callback()
+
+def enable_cascade(model=SCREEN_MODEL, detail=SCREEN_DETAIL, threshold=CONFIDENCE_THRESHOLD):
+    """Screen every site with a cheap model first and escalate only unsure verdicts to the full model."""
+    global cascade
+    cascade = Cascade(model=model, detail=detail, threshold=threshold)
+    logger.info(f"Cascade: {model} at {detail} detail first, {CLASSIFICATION_MODEL} below "
+                f"confidence {threshold:g}")
+    return cascade
+
+def log_cost_summary(sites=None):
+    lines = cost_tracker.summary(sites=sites)
+    if cascade:
+        lines += cascade.summary()
+    if hedger:
+        lines += hedger.summary(extra_cost=cost_tracker.stage_cost("hedge"),
+                                base_cost=cost_tracker.stage_cost("classify"))
+    for line in lines:
+        logger.info(line)
+
+def stored_screenshots(capture):
+    """The screenshot fields kept with a result (both None if nothing was captured)."""
+    capture = capture or {}
+    return {
+        "screenshot_file": capture.get("screenshot_file"),
+        "mobile_screenshot_file": capture.get("mobile_screenshot_file"),
+    }
+
 @timer_decorator
-def classify_website(website_url, screenshot_file="screenshot.png"):
+def classify_website(website_url, detail=None):
+    """Capture and classify one site. Returns (verdict, stored screenshot paths)."""
     logger.info(f"Processing website: {website_url}")
     
-    # Capture screenshot
-    start_time = time.time()
-    logger.info(f"Capturing screenshot of {website_url}")
-    try:
-        capture_screenshot(website_url, screenshot_file)
-        logger.info(f"Screenshot capture took {time.time() - start_time:.2f} seconds")
-    except Exception as e:
-        logger.error(f"Screenshot capture failed for {website_url}: {str(e)}")
-        return "not good website\n- Unable to capture screenshot"
-    
-    # Encode image
-    start_time = time.time()
-    if not os.path.exists(screenshot_file):
-        error_msg = f"Screenshot file not found: {screenshot_file}"
-        logger.error(error_msg)
-        return f"not good website\n- {error_msg}"
-        
-    try:
-        with open(screenshot_file, "rb") as image_file:
-            encoded_image = base64.b64encode(image_file.read()).decode("utf-8")
-        logger.info(f"Image encoding took {time.time() - start_time:.2f} seconds")
-    except Exception as e:
-        logger.error(f"Image encoding failed: {str(e)}")
-        return "not good website\n- Failed to process screenshot"
-    
+    capture, failure = capture_and_encode(website_url)
+    if failure:
+        return failure, stored_screenshots(None)
+    return classify_capture(capture, detail=detail), stored_screenshots(capture)
+
+def classify_capture(capture, detail=None):
+    if cascade:
+        return classify_cascade(capture, detail=detail)
     # Prepare messages for GPT‑4o
-    messages = [
-    {
-        "role": "system",
-        "content": (
-            "You are GPT-4o, an expert in evaluating modern business websites for user-centric design, "
-            "visual appeal, and effective UX. You will receive a screenshot of a website and analyze it "
-            "using the following criteria from 'Modern Business Website Design: Principles for Engagement "
-            "and UX':\n\n"
-            "1. **Visual Design**: Color usage and branding, cohesive palette, typography clarity/hierarchy, "
-            "   use of high-quality/optimized imagery, and sufficient whitespace.\n"
-            "2. **Layout & Structure**: Clear hierarchy of content, grid systems or alignment, effective use "
-            "   of whitespace, logical grouping of elements, and scannability.\n"
-            "3. **Navigation & Accessibility**: Intuitive menus, consistent navigation patterns, adequate "
-            "   color contrast, alt text on images, keyboard-friendly controls, and compliance with basic "
-            "   accessibility practices.\n"
-            "4. **Interactivity & Engagement**: Micro-interactions (hover states, button feedback), subtle "
-            "   animations/transition effects, and purposeful interactive features that enrich the user "
-            "   experience.\n"
-            "5. **Modern Trends**: Thoughtful inclusion of trends like dark mode, glassmorphism, "
-            "   neumorphism, AI personalization, or immersive/3D elements—only if they enhance usability.\n"
-            "6. **Conversion Optimization**: Placement and clarity of CTAs, trust signals (testimonials, "
-            "   security badges), streamlined form design, and overall persuasiveness.\n"
-            "7. **Mobile Optimization**: Fully responsive layout, legible touch targets, well-structured "
-            "   content on small screens, and minimal load times.\n"
-            "8. **UX Enhancements & Performance**: Fast page loads, intuitive user feedback (loading states, "
-            "   success/error messages), easily digestible content, and continuous improvement signals (e.g., "
-            "   A/B tested elements).\n\n"
-            "After examining the screenshot, you **must**:\n"
-            "- Begin your response with exactly one of these phrases on its own line: 'good website' or "
-            "  'not good website'.\n"
-            "- Follow that verdict with bullet points summarizing how well (or poorly) the site meets the "
-            "  above criteria.\n"
-            "- If you judge the site as 'not good website', identify the highest-priority fixes. Keep the "
-            "  focus on design, structure, UX, and performance aspects.\n\n"
-            "Your goal is to provide a concise but thorough analysis that references specific design "
-            "principles rather than just general impressions."
-        )
-    },
-    {
-        "role": "user",
-        "content": [
-            {
-                "type": "text",
-                "text": (
-                    "Here is a screenshot of a website. Please evaluate it according to the modern business "
-                    "web design best practices in your instructions. Then give a final verdict ('good website' "
-                    "or 'not good website') plus bullet points explaining why."
-                )
-            },
-            {
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/png;base64,{encoded_image}"
-                }
-            }
-        ]
-    }
-]
+    messages = build_messages(capture["images"], detail=detail)
+    if stream_executor:
+        return classify_streaming(capture, messages, detail=detail)
+    return request_verdict(messages, detail=detail)
 
+def classify_cascade(capture, detail=None):
+    """Keep a confident first-pass verdict; otherwise ask the full model at full detail."""
+    screen = screen_capture(capture, cascade)
+    escalate = cascade.needs_escalation(screen)
+    cascade.record(screen, escalate)
+    if not escalate:
+        logger.info(f"Kept {cascade.model} verdict '{screen['verdict']}' (confidence {screen['confidence']:.2f})")
+        return screen
+    logger.info(f"Escalating to {CLASSIFICATION_MODEL} (first pass: {screen.get('error') or screen.get('confidence')})")
+    return request_verdict(build_messages(capture["images"], detail=detail), detail=detail)
 
-    
+def screen_capture(capture, cascade):
+    """First pass of the cascade: the cheap model's verdict with its confidence."""
+    messages = build_messages(capture["images"], detail=cascade.detail,
+                              system_prompt=CLASSIFICATION_SYSTEM_PROMPT + SCREENING_PROMPT)
+    return request_verdict(messages, model=cascade.model, detail=cascade.detail, stage="screen",
+                           response_format=SCREENING_RESPONSE_FORMAT)
+
+def request_verdict(messages, model=CLASSIFICATION_MODEL, detail=None, stage="classify",
+                    response_format=RESPONSE_FORMAT):
+    """One classification call; returns the parsed verdict or a failed verdict."""
     # API call
     start_time = time.time()
     logger.info("Preparing API call...")
     try:
-        response = client.chat.completions.create(  # Updated API call syntax
-            model="gpt-4o",  # Updated model name
+        request = dict(
+            model=model,
             messages=messages,
-            max_tokens=1000,
-            temperature=0.2,
+            max_tokens=CLASSIFICATION_MAX_TOKENS,
+            temperature=CLASSIFICATION_TEMPERATURE,
+            response_format=response_format,
         )
+        # Hedging is tuned on the full model's latency, so the cheap first pass is not hedged
+        if hedger and model == CLASSIFICATION_MODEL:
+            response, hedged, _ = hedger.create(**request)
+        else:
+            response, hedged = client.chat.completions.create(**request), False
         logger.info(f"API call took {time.time() - start_time:.2f} seconds")
+        cost_tracker.record(stage, model, response.usage, detail=detail)
+        if hedged:
+            # The cancelled twin had the same prompt and may be billed for it and the tokens it
+            # generated; count it like the answer that won so budgets and summaries include it
+            cost_tracker.record("hedge", model, response.usage, detail=detail)
         
         classification_result = response.choices[0].message.content
         if not classification_result:
             logger.error("Empty response from API")
-            return "not good website\n- Analysis failed due to empty API response"
+            return failed_verdict("Analysis failed due to empty API response")
             
-        logger.info("Classification result received")
-        return classification_result
+        verdict = parse_verdict(classification_result)
+        logger.info(f"Classification result received: {verdict['verdict']}")
+        return verdict
         
+    except VerdictError as e:
+        logger.error(f"Invalid verdict from API: {str(e)}")
+        return failed_verdict(f"Analysis failed: invalid verdict ({str(e)})")
     except Exception as e:
         error_msg = f"Error in API call: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        return f"not good website\n- Analysis failed: {error_msg}"
-
-def generate_html_report(results, output_file):
-    logger.info(f"Generating HTML report to {output_file}")
-    html = [
-        "<html>",
-        "<head>",
-        "<meta charset='UTF-8'>",
-        "<title>Website Classification Report</title>",
-        "<style>",
-        "body { font-family: Arial, sans-serif; }",
-        "img { max-width: 600px; border: 1px solid #ccc; margin: 10px 0; }",
-        "h2 { color: #333; }",
-        "</style>",
-        "</head>",
-        "<body>",
-        "<h1>Website Classification Report</h1>",
-    ]
-    
-    for website, (screenshot_file, classification) in results.items():
-        logger.debug(f"Adding report entry for {website}")
-        html.append(f"<h2>{website}</h2>")
-        if os.path.exists(screenshot_file):
-            # Read and encode the screenshot
-            with open(screenshot_file, "rb") as img_file:
-                encoded_img = base64.b64encode(img_file.read()).decode("utf-8")
-            html.append(f'<img src="data:image/png;base64,{encoded_img}" alt="Screenshot of {website}"/>')
-        else:
-            logger.warning(f"Screenshot not found for {website}")
-            html.append("<p>[Screenshot not found]</p>")
-        html.append(f"<p><strong>Classification:</strong> {classification}</p>")
-        html.append("<hr/>")
-    
-    html.append("</body></html>")
-    
-    with open(output_file, "w", encoding="utf-8") as f:
-        f.write("\n".join(html))
-    logger.info(f"HTML report generated: {output_file}")
+        return failed_verdict(f"Analysis failed: {error_msg}")
+
+def classify_streaming(capture, messages, detail=None):
+    """Return as soon as the verdict and scores have streamed in.
+
+    Good sites stop generating there. For not-good sites the returned verdict
+    is filled in with its summary and priority fixes by a background thread;
+    wait_for_verdicts() waits for those before anything is stored.
+    """
+    start_time = time.time()
+    prompt_tokens = estimate_prompt_tokens(capture, detail)
+    stream = None
+    try:
+        stream = VerdictStream(client.chat.completions.create(
+            model=CLASSIFICATION_MODEL,
+            messages=messages,
+            max_tokens=CLASSIFICATION_MAX_TOKENS,
+            temperature=CLASSIFICATION_TEMPERATURE,
+            response_format=RESPONSE_FORMAT,
+            stream=True,
+            stream_options={"include_usage": True},
+        ))
+        decision = stream.read_decision()
+        if decision is None:
+            # No usable verdict before the answer ended: report why
+            try:
+                return stream.read_rest()
+            finally:
+                cost_tracker.record("classify", CLASSIFICATION_MODEL, stream.usage_tokens(prompt_tokens),
+                                    detail=detail)
+    except VerdictError as e:
+        logger.error(f"Invalid verdict from API: {str(e)}")
+        return failed_verdict(f"Analysis failed: invalid verdict ({str(e)})")
+    except Exception as e:
+        error_msg = f"Error in API call: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        if stream:
+            stream.close()
+        return failed_verdict(f"Analysis failed: {error_msg}")
+
+    logger.info(f"Verdict '{decision['verdict']}' after {time.time() - start_time:.2f} seconds "
+                f"({stream.content_chunks} tokens)")
+    if decision["verdict"] == "good":
+        stream.close()
+        cost_tracker.record("classify", CLASSIFICATION_MODEL, stream.usage_tokens(prompt_tokens), detail=detail)
+        return decision
+
+    pending_verdicts[:] = [(v, f) for v, f in pending_verdicts if not f.done()]
+    future = stream_executor.submit(finish_streamed_verdict, stream, decision, prompt_tokens, detail)
+    pending_verdicts.append((decision, future))
+    return decision
+
+def finish_streamed_verdict(stream, verdict, prompt_tokens, detail=None):
+    """Read the rest of a not-good answer into `verdict` (in place) for the report."""
+    try:
+        verdict.update(stream.read_rest())
+    except Exception as e:
+        # The decision already made stands; only the explanation is missing
+        logger.error(f"Streamed verdict could not be completed: {str(e)}")
+        verdict["summary"] = [f"Summary unavailable: {str(e)}"]
+    finally:
+        stream.close()
+        cost_tracker.record("classify", CLASSIFICATION_MODEL, stream.usage_tokens(prompt_tokens), detail=detail)
 
 def get_simplified_company_name(company_name):
     if not company_name:
         return ""
+    # Before the first call: about 60 prompt tokens and the full 50-token answer
+    estimate = cost_tracker.average_cost("company_name") or token_cost("gpt-4", 60, 50)
+    if not cost_tracker.can_queue(estimate):
+        # Over budget: fall back to the local approximation rather than spend more
+        return company_name.title()
         
     try:
         response = client.chat.completions.create(
@@ -221,87 +471,343 @@ def get_simplified_company_name(company_name):
             max_tokens=50,
             temperature=0
         )
+        cost_tracker.record("company_name", "gpt-4", response.usage)
         simplified_name = response.choices[0].message.content.strip()
         return simplified_name
     except Exception as e:
         logger.error(f"Error simplifying company name: {str(e)}")
         return company_name.title()
 
-def write_csv_report(not_good_rows, csv_file):
-    logger.info(f"Writing CSV report to {csv_file}")
-    fieldnames = ["website", "company_name", "first_name", "last_name", "email", "location"]
-    try:
-        with open(csv_file, "w", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in not_good_rows:
-                # Get simplified company name
-                simplified_name = get_simplified_company_name(row.get("company_name", ""))
-                row["company_name"] = simplified_name
-                writer.writerow(row)
-        logger.info(f"CSV report generated: {csv_file}")
-    except Exception as e:
-        logger.error(f"Error writing CSV report: {str(e)}", exc_info=True)
+def finish_run(run, list_name, items, threshold=None):
+    """Persist verdicts in the results store and write the CSV/HTML reports."""
+    wait_for_verdicts()
+    ResultsStore().add_many(run, list_name, items)
+    logger.info(f"Stored {len(items)} results for run '{run}'")
+    write_reports(items, threshold=threshold, simplify_name=get_simplified_company_name)
+    log_cost_summary(sites=len(items))
 
-@timer_decorator
-def main():
-    # Get number of websites from command line argument
-    import sys
-    if len(sys.argv) != 2:
-        logger.error("Usage: python3 classify_website.py <number_of_websites>")
-        sys.exit(1)
-    try:
-        num_websites = int(sys.argv[1])
-    except ValueError:
-        logger.error("Please provide a valid number")
-        sys.exit(1)
+def run_local(num_websites, threshold=None, budget=None):
+    """Classify contacts straight from Apollo in this process."""
+    from apollo import get_contacts_from_apollo, CURRENT_LIST_NAME
 
-    logger.info("Starting main process")
-    
     start_time = time.time()
     contacts = get_contacts_from_apollo()
     logger.info(f"Apollo API call took {time.time() - start_time:.2f} seconds")
     logger.info(f"Retrieved {len(contacts)} contacts")
     
-    # Get the list name from apollo.py
-    from apollo import CURRENT_LIST_NAME
+    logger.info(f"Saving screenshots to store: {screenshot_store.root}")
     
-    # Create screenshots directory if it doesn't exist
-    screenshots_dir = CURRENT_LIST_NAME
-    os.makedirs(screenshots_dir, exist_ok=True)
-    logger.info(f"Saving screenshots to directory: {screenshots_dir}")
-    
-    results = {}
-    not_good_rows = []
+    run = f"{CURRENT_LIST_NAME}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    start_cost_tracking(run, CURRENT_LIST_NAME, budget)
+    items = []
     
     for i, contact in enumerate(contacts[:num_websites], start=1):
         website = contact["website"]
-        screenshot_file = f"{screenshots_dir}/screenshot_{i}.png"
+        allowed, detail = next_site_allowance()
+        if not allowed:
+            logger.warning(f"Budget reached; not classifying the remaining {len(contacts[:num_websites]) - i + 1} sites")
+            break
         logger.info(f"Processing website {i}/{num_websites}: {website}")
         
-        classification = classify_website(website, screenshot_file=screenshot_file)
-        results[website] = (screenshot_file, classification)
-        
-        if classification and "not good" in classification.lower():
-            not_good_rows.append({
-                "website": website,
-                "company_name": contact.get("company_name", ""),
-                "first_name": contact.get("first_name", ""),
-                "last_name": contact.get("last_name", ""),
-                "email": contact.get("email", ""),
-                "location": contact.get("location", "")
-            })
-    
-    logger.info("Generating reports...")
+        verdict, screenshots = classify_website(website, detail=detail)
+        items.append({"contact": contact, "verdict": verdict, **screenshots})
     
-    # Generate timestamp for filenames
-    timestamp = datetime.now().strftime("%H-%M-%S_%m-%d-%Y")
-    csv_file = f"ng_{timestamp}.csv"
-    html_file = f"ng_{timestamp}.html"
-    
-    if not_good_rows:
-        write_csv_report(not_good_rows, csv_file)
-    generate_html_report(results, html_file)
+    finish_run(run, CURRENT_LIST_NAME, items, threshold=threshold)
+
+def enqueue_contacts(queue, run, num_websites):
+    """Fetch contacts from Apollo and add one classification task per website."""
+    from apollo import get_contacts_from_apollo, extract_domain, CURRENT_LIST_NAME
+
+    start_time = time.time()
+    contacts = get_contacts_from_apollo(num_contacts=num_websites)
+    logger.info(f"Apollo API call took {time.time() - start_time:.2f} seconds")
+    added = queue.enqueue(run, [
+        (extract_domain(c["website"]) or c["website"], dict(c, list_name=CURRENT_LIST_NAME)) for c in contacts
+    ])
+    logger.info(f"Enqueued {added} new tasks for run '{run}' ({len(contacts) - added} already queued)")
+
+def run_worker(queue, run, worker_id, visibility_timeout, poll_interval=5.0, max_tasks=None, budget=None):
+    """Lease and classify tasks until the run has nothing left to do (or its budget is spent)."""
+    # Spend is summed from the results store, so the budget is shared by every worker of the run
+    start_cost_tracking(run, None, budget)
+    processed = 0
+    while max_tasks is None or processed < max_tasks:
+        allowed, detail = next_site_allowance()
+        if not allowed:
+            logger.warning(f"[{worker_id}] Budget for run '{run}' reached; leaving remaining tasks queued")
+            break
+        task = queue.lease(run, worker_id, visibility_timeout=visibility_timeout)
+        if task is None:
+            counts = queue.counts(run)
+            if not counts.get("pending") and not counts.get("leased"):
+                break
+            # Other workers still hold leases; wait in case one of them expires
+            time.sleep(poll_interval)
+            continue
+
+        contact = task.payload
+        cost_tracker.list_name = contact.get("list_name")
+        logger.info(f"[{worker_id}] Task {task.id} (attempt {task.attempts}): {contact['website']}")
+        try:
+            verdict, screenshots = classify_website(contact["website"], detail=detail)
+        except Exception as e:
+            logger.error(f"Task {task.id} failed: {str(e)}", exc_info=True)
+            queue.fail(task, e)
+            continue
+        if verdict.get("error") and task.attempts < queue.max_attempts:
+            # Capture and API errors are usually transient: let the task be retried.
+            # On its last attempt the failed verdict is kept, so the site is still reported.
+            logger.warning(f"[{worker_id}] Task {task.id} failed ({verdict['error']}); returning it for retry")
+            queue.fail(task, verdict["error"])
+            continue
+
+        result = {
+            "verdict": verdict,
+            **screenshots,
+            "worker": worker_id,
+        }
+        # A streamed not-good verdict is acked once its summary has arrived
+        when_verdict_complete(verdict, lambda task=task, result=result: ack_result(queue, task, result))
+        processed += 1
+    wait_for_verdicts()
+    logger.info(f"[{worker_id}] Processed {processed} tasks for run '{run}'")
+    log_cost_summary(sites=processed)
+
+def ack_result(queue, task, result):
+    if not queue.ack(task, result):
+        logger.warning(f"Lease on task {task.id} expired before ack; result discarded")
+
+def report_run(queue, run, threshold=None, budget=None):
+    """Build the usual CSV/HTML reports from every finished task of a run."""
+    counts = queue.counts(run)
+    logger.info(f"Run '{run}' status: {counts}")
+    if counts.get("pending") or counts.get("leased"):
+        logger.warning("Run still has unfinished tasks; reporting on what is done so far")
+
+    items = []
+    for _, contact, result in queue.results(run):
+        # Results queued before structured verdicts carry free text under "classification"
+        verdict = as_verdict(result.get("verdict", result.get("classification")))
+        items.append({
+            "contact": contact,
+            "verdict": verdict,
+            "screenshot_file": result["screenshot_file"],
+            "mobile_screenshot_file": result.get("mobile_screenshot_file"),
+        })
+    list_name = items[0]["contact"].get("list_name") if items else None
+    start_cost_tracking(run, list_name, budget)
+    finish_run(run, list_name, items, threshold=threshold)
+
+    logger.info(f"Cost of run '{run}' across all workers:")
+    for row in cost_tracker.store.cost_summary(run=run, by=("stage", "model")):
+        logger.info(f"    {row['stage']:<14} {row['model']:<20} {row['calls']:>5} calls "
+                    f"{row['prompt_tokens']:>10,} in {row['completion_tokens']:>8,} out  ${row['cost']:.4f}")
+
+def run_batch(num_websites, poll_interval, threshold=None, budget=None):
+    """Capture every screenshot, then classify them all in one offline Batch API job."""
+    from apollo import get_contacts_from_apollo, CURRENT_LIST_NAME
+    import batch_classify
+
+    contacts = get_contacts_from_apollo(num_contacts=num_websites)
+    logger.info(f"Retrieved {len(contacts)} contacts")
+
+    # Batch input files and the resumable state live here; screenshots go to the store
+    work_dir = CURRENT_LIST_NAME
+    os.makedirs(work_dir, exist_ok=True)
+    run = f"{CURRENT_LIST_NAME}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    state_file = os.path.join(work_dir, f"batch_{run}.json")
+    state = batch_classify.new_state(run, work_dir)
+    state["list_name"] = CURRENT_LIST_NAME
+    state["budget"] = budget
+    state["contacts"] = contacts[:num_websites]
+    batch_classify.save_state(state, state_file)
+    logger.info(f"Batch state saved to {state_file} (resume with --resume-batch {state_file})")
+    finish_batch(state, state_file, poll_interval, threshold=threshold)
+
+def capture_batch(state, state_file):
+    """Capture every contact of a batch run not captured yet, saving progress as it goes.
+
+    A run restarted with --resume-batch after a crash keeps the captures it
+    already has and continues with the next contact.
+    """
+    import batch_classify
+
+    contacts = state["contacts"]
+    # Nothing is billed until the batch runs, so budget against worst-case estimates instead
+    planned = sum(item.get("estimate", 0.0) for item in state["items"].values())
+    for i, contact in enumerate(contacts, start=1):
+        custom_id = f"site-{i}"
+        if custom_id in state["items"]:
+            continue
+        logger.info(f"Capturing website {i}/{len(contacts)}: {contact['website']}")
+        capture, failure = capture_and_encode(contact["website"])
+        item = {"contact": contact, **stored_screenshots(capture), "verdict": failure}
+        if not failure:
+            item["detail"] = cost_tracker.image_detail(planned)
+            item["estimate"] = estimate_request_cost(capture, item["detail"], batch=True)
+            if not cost_tracker.can_queue(item["estimate"], planned):
+                logger.warning(f"Budget reached at ${planned:.4f} estimated; "
+                               f"leaving {len(contacts) - i + 1} sites out of the batch")
+                state["contacts"] = contacts[:i - 1]
+                break
+            planned += item["estimate"]
+        state["items"][custom_id] = item
+        if len(state["items"]) % BATCH_SAVE_EVERY == 0:
+            batch_classify.save_state(state, state_file)
+    state["captured"] = True
+    batch_classify.save_state(state, state_file)
+
+def write_batch_input(state):
+    """Write batch input files for every captured site still waiting for a verdict (adds new parts)."""
+    import batch_classify
+
+    def batch_requests():
+        for custom_id, item in state["items"].items():
+            if not item.get("verdict"):
+                yield custom_id, build_messages(encode_images(item), detail=item.get("detail"))
+
+    batch_classify.write_batch_files(state, batch_requests(), {
+        "model": CLASSIFICATION_MODEL,
+        "max_tokens": CLASSIFICATION_MAX_TOKENS,
+        "temperature": CLASSIFICATION_TEMPERATURE,
+        "response_format": RESPONSE_FORMAT,
+    })
+
+def finish_batch(state, state_file, poll_interval, threshold=None):
+    """Submit (if needed), wait for and report on a batch run. Safe to call again after a restart."""
+    import batch_classify
+
+    if cost_tracker.run != state["run"]:
+        start_cost_tracking(state["run"], state.get("list_name"), state.get("budget"))
+    # State files written before captures were saved incrementally have no "captured" flag
+    if not state.get("captured", True):
+        capture_batch(state, state_file)
+    if not state["batches"]:
+        write_batch_input(state)
+        batch_classify.save_state(state, state_file)
+    unanswered = batch_classify.complete_batches(client, state, state_file, write_batch_input,
+                                                 poll_interval=poll_interval)
+
+    for item in state["items"].values():
+        if item.get("usage") and not item.get("cost_recorded"):
+            cost_tracker.record("classify", CLASSIFICATION_MODEL, item["usage"], batch=True)
+            item["cost_recorded"] = True
+    batch_classify.save_state(state, state_file)
+
+    if unanswered:
+        # A failed verdict would make these leads; leave them out until a batch answers them
+        logger.warning(f"{len(unanswered)} sites still have no batch response and are left out of the report; "
+                       f"retry them with --resume-batch {state_file}")
+    items = [item for item in state["items"].values() if item.get("verdict")]
+    finish_run(state["run"], state.get("list_name"), items, threshold=threshold)
+
+def parse_args(argv=None):
+    import argparse
+    import socket
+    parser = argparse.ArgumentParser(
+        description="Classify websites of Apollo contacts",
+        epilog=(
+            "Single process: classify_website.py 10\n"
+            "Distributed:    classify_website.py 500 --enqueue --run R\n"
+            "                classify_website.py --work --run R   (on each worker)\n"
+            "                classify_website.py --report --run R\n"
+            "Batch API:      classify_website.py 2000 --batch\n"
+            "                classify_website.py --resume-batch <state.json>"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("num_websites", nargs="?", type=int, help="number of websites to classify or enqueue")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--enqueue", action="store_true", help="fetch contacts from Apollo into the work queue")
+    mode.add_argument("--work", action="store_true", help="lease and classify tasks from the work queue")
+    mode.add_argument("--report", action="store_true", help="write reports from the queue's results")
+    mode.add_argument("--batch", action="store_true", help="classify through the offline Batch API")
+    mode.add_argument("--resume-batch", metavar="STATE_FILE", help="resume polling a --batch run after a restart")
+    parser.add_argument("--queue", default=os.getenv("CLASSIFY_QUEUE", "sqlite:///classification_queue.db"),
+                        help="work queue URL (default: %(default)s)")
+    parser.add_argument("--run", help="name of the queued run (default for --enqueue: <list>_<timestamp>)")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    parser.add_argument("--screenshots-dir", help="screenshot store directory (default: $SCREENSHOT_STORE_DIR "
+                                                  "or ./screenshot_store)")
+    parser.add_argument("--visibility-timeout", type=float, default=600,
+                        help="seconds before an un-acked task is handed to another worker")
+    parser.add_argument("--max-tasks", type=int, help="stop a worker after this many tasks")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between batch status checks")
+    parser.add_argument("--budget", type=float, metavar="USD",
+                        help="hard spending limit for the run; near it screenshots go at low detail, "
+                             "at it no more sites are classified")
+    parser.add_argument("--threshold", type=float,
+                        help="also treat 'good' sites whose average criterion score is below this as leads")
+    parser.add_argument("--hedge", action="store_true",
+                        help="re-send classification calls that run past --hedge-percentile of recent latency; "
+                             "the first answer wins (not used with --batch)")
+    parser.add_argument("--hedge-percentile", type=float, default=DEFAULT_PERCENTILE,
+                        help="latency percentile after which a call is hedged (default: %(default)s)")
+    parser.add_argument("--hedge-max-ratio", type=float, default=DEFAULT_MAX_HEDGE_RATIO,
+                        help="most calls that may be hedged, as a fraction (default: %(default)s)")
+    parser.add_argument("--cascade", action="store_true",
+                        help="screen each site with a cheaper model at low detail first and send only "
+                             "low-confidence verdicts to the full model (not used with --batch)")
+    parser.add_argument("--cascade-model", default=SCREEN_MODEL, help="first-pass model (default: %(default)s)")
+    parser.add_argument("--cascade-detail", default=SCREEN_DETAIL, choices=["low", "high", "auto"],
+                        help="first-pass image detail (default: %(default)s)")
+    parser.add_argument("--cascade-threshold", type=float, default=CONFIDENCE_THRESHOLD,
+                        help="first-pass confidence below which a site is escalated (default: %(default)s)")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream answers: decide each site from its verdict and scores, stop good sites "
+                             "there and finish not-good summaries in the background (not used with --batch)")
+    args = parser.parse_args(argv)
+
+    if not (args.work or args.report or args.resume_batch) and args.num_websites is None:
+        parser.error("num_websites is required")
+    if (args.work or args.report) and not args.run:
+        parser.error("--run is required with --work and --report")
+    if args.stream and args.hedge:
+        parser.error("--stream and --hedge cannot be combined")
+    if args.stream and args.cascade:
+        parser.error("--stream and --cascade cannot be combined")
+    return args
+
+@timer_decorator
+def main():
+    global screenshot_store
+    args = parse_args()
+    logger.info("Starting main process")
+    if args.hedge and not (args.batch or args.resume_batch or args.enqueue or args.report):
+        enable_hedging(args.hedge_percentile, args.hedge_max_ratio)
+    if args.stream and not (args.batch or args.resume_batch or args.enqueue or args.report):
+        enable_streaming()
+    if args.cascade and not (args.batch or args.resume_batch or args.enqueue or args.report):
+        enable_cascade(args.cascade_model, args.cascade_detail, args.cascade_threshold)
+
+    if args.batch:
+        run_batch(args.num_websites, args.poll_interval, threshold=args.threshold, budget=args.budget)
+        return
+    if args.resume_batch:
+        import batch_classify
+        state = batch_classify.load_state(args.resume_batch)
+        finish_batch(state, args.resume_batch, args.poll_interval, threshold=args.threshold)
+        return
+    if not (args.enqueue or args.work or args.report):
+        run_local(args.num_websites, threshold=args.threshold, budget=args.budget)
+        return
+
+    from work_queue import open_queue
+    queue = open_queue(args.queue)
+
+    if args.enqueue:
+        if not args.run:
+            from apollo import CURRENT_LIST_NAME
+            args.run = f"{CURRENT_LIST_NAME}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        enqueue_contacts(queue, args.run, args.num_websites)
+        print(f"Run name: {args.run}")
+    elif args.work:
+        if args.screenshots_dir:
+            screenshot_store = ScreenshotStore(args.screenshots_dir)
+        run_worker(queue, args.run, args.worker_id, args.visibility_timeout,
+                   max_tasks=args.max_tasks, budget=args.budget)
+    else:
+        report_run(queue, args.run, threshold=args.threshold, budget=args.budget)
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,188 @@
+"""
+Token and cost accounting for classification runs.
+
+Every OpenAI call reports its `usage`; CostTracker prices it, keeps
+running totals per stage and model, and (when given a ResultsStore)
+records it per call so spend can be aggregated per run, stage or Apollo
+list afterwards (`results_store.py costs`).
+
+With a budget the tracker also drives the scheduler: once spend reaches
+`degrade_at` of the budget screenshots are sent at low image detail, and
+once the next call would exceed the budget no more sites are queued.
+"""
+import logging
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M tokens: (input, output). Override or extend with CLASSIFY_PRICES="model=in/out,..."
+PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-4-turbo": (10.00, 30.00),
+}
+# The Batch API bills half the synchronous price
+BATCH_DISCOUNT = 0.5
+DEFAULT_DEGRADE_AT = float(os.getenv("CLASSIFY_BUDGET_DEGRADE_AT", "0.8"))
+
+# Image token accounting for GPT-4o vision inputs
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+
+
+def _load_price_overrides():
+    for entry in filter(None, os.getenv("CLASSIFY_PRICES", "").split(",")):
+        model, _, prices = entry.partition("=")
+        prompt, _, completion = prices.partition("/")
+        PRICES[model.strip()] = (float(prompt), float(completion))
+
+
+_load_price_overrides()
+
+
+def _usage_tokens(usage):
+    """(prompt_tokens, completion_tokens) from an SDK usage object or a batch output dict."""
+    if usage is None:
+        return 0, 0
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    return getattr(usage, "prompt_tokens", 0) or 0, getattr(usage, "completion_tokens", 0) or 0
+
+
+def token_cost(model, prompt_tokens, completion_tokens, batch=False):
+    """USD cost of a call. Dated snapshots (gpt-4o-2024-08-06) use their base model's price."""
+    prices = PRICES.get(model)
+    if prices is None:
+        base = max((name for name in PRICES if model.startswith(name)), key=len, default=None)
+        if base is None:
+            logger.warning(f"No price known for model {model}; counting its tokens at $0")
+            return 0.0
+        prices = PRICES[base]
+    cost = (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def png_size(path):
+    """(width, height) read from a PNG header, or None if it is not a PNG."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(24)
+    except OSError:
+        return None
+    if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def image_tokens(width, height, detail="high"):
+    """Prompt tokens GPT-4o charges for one image at the given detail."""
+    if detail == "low":
+        return LOW_DETAIL_TOKENS
+    # Scaled to fit 2048x2048, then the short side to 768, then counted in 512px tiles
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = -(-int(width) // 512) * -(-int(height) // 512)
+    return LOW_DETAIL_TOKENS + TILE_TOKENS * tiles
+
+
+class CostTracker:
+    def __init__(self, run=None, list_name=None, budget=None, degrade_at=DEFAULT_DEGRADE_AT, store=None):
+        self.run = run
+        self.list_name = list_name
+        self.budget = budget
+        self.degrade_at = degrade_at
+        self.store = store
+        self.started = time.time()
+        self.totals = {}  # (stage, model) -> {"calls", "prompt_tokens", "completion_tokens", "cost"}
+        self._lock = threading.Lock()
+        self._degraded = False
+
+    def record(self, stage, model, usage, batch=False, detail=None):
+        """Account for one API call and return its cost."""
+        prompt_tokens, completion_tokens = _usage_tokens(usage)
+        cost = token_cost(model, prompt_tokens, completion_tokens, batch=batch)
+        with self._lock:
+            total = self.totals.setdefault(
+                (stage, model), {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+            )
+            total["calls"] += 1
+            total["prompt_tokens"] += prompt_tokens
+            total["completion_tokens"] += completion_tokens
+            total["cost"] += cost
+        if self.store is not None and self.run is not None:
+            self.store.add_cost(self.run, self.list_name, stage, model, prompt_tokens, completion_tokens,
+                                cost, batch=batch, detail=detail)
+        return cost
+
+    def local_spent(self):
+        with self._lock:
+            return sum(total["cost"] for total in self.totals.values())
+
+    def spent(self):
+        """Spend on this run so far. With a store this includes other workers of the same run."""
+        if self.store is not None and self.run is not None:
+            return self.store.run_cost(self.run)
+        return self.local_spent()
+
+    def stage_cost(self, stage):
+        with self._lock:
+            return sum(t["cost"] for (s, _), t in self.totals.items() if s == stage)
+
+    def average_cost(self, stage):
+        with self._lock:
+            calls = sum(t["calls"] for (s, _), t in self.totals.items() if s == stage)
+            cost = sum(t["cost"] for (s, _), t in self.totals.items() if s == stage)
+        return cost / calls if calls else 0.0
+
+    def image_detail(self, spent=None):
+        """'low' once spend passes the degrade point of the budget, otherwise None (API default)."""
+        if self.budget is None:
+            return None
+        if spent is None:
+            spent = self.spent()
+        if spent >= self.budget * self.degrade_at:
+            if not self._degraded:
+                logger.warning(f"Spent ${spent:.4f} of ${self.budget:.2f} budget; "
+                               "switching screenshots to low image detail")
+                self._degraded = True
+            return "low"
+        return None
+
+    def can_queue(self, estimate=0.0, spent=None):
+        """False once another call costing `estimate` would take the run over budget."""
+        if self.budget is None:
+            return True
+        if spent is None:
+            spent = self.spent()
+        return spent + estimate <= self.budget
+
+    def summary(self, sites=None):
+        """Cost/throughput summary lines for the end of a run."""
+        elapsed = time.time() - self.started
+        with self._lock:
+            totals = sorted(self.totals.items())
+        cost = sum(t["cost"] for _, t in totals)
+        prompt_tokens = sum(t["prompt_tokens"] for _, t in totals)
+        completion_tokens = sum(t["completion_tokens"] for _, t in totals)
+
+        header = f"Run {self.run or '-'}"
+        if sites is not None:
+            rate = sites / elapsed * 60 if elapsed else 0.0
+            header += f": {sites} sites in {elapsed:.1f}s ({rate:.1f} sites/min)"
+        lines = [header, f"  tokens: {prompt_tokens:,} prompt + {completion_tokens:,} completion"]
+        cost_line = f"  cost: ${cost:.4f}"
+        if sites:
+            cost_line += f" (${cost / sites:.4f}/site)"
+        if self.budget is not None:
+            cost_line += f" of ${self.budget:.2f} budget"
+        lines.append(cost_line)
+        for (stage, model), t in totals:
+            lines.append(f"    {stage:<14} {model:<20} {t['calls']:>5} calls "
+                         f"{t['prompt_tokens']:>10,} in {t['completion_tokens']:>8,} out  ${t['cost']:.4f}")
+        return lines
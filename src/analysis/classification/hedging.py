@@ -0,0 +1,227 @@
+"""
+Hedged chat-completion requests.
+
+A classification call that has not returned by the configured percentile
+of recent latencies gets a duplicate request; whichever answers first is
+used and the other is cancelled. Hedges stop once they would exceed
+`max_hedge_ratio` of all calls, which bounds the extra spend (a cancelled
+request may still be billed for the tokens it already used). `create`
+says whether a call was hedged so the caller can account for the loser.
+
+HedgedCaller runs an AsyncOpenAI client on its own event loop thread so
+synchronous code like classify_website can call it directly.
+
+Run `python3 hedging.py` to compare latency with and without hedging
+against a local fake server that injects slow responses.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERCENTILE = 95
+DEFAULT_MAX_HEDGE_RATIO = 0.1
+# No hedging until there are enough samples for the percentile to mean anything
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+class HedgedCaller:
+    def __init__(self, async_client, percentile=DEFAULT_PERCENTILE, max_hedge_ratio=DEFAULT_MAX_HEDGE_RATIO,
+                 min_samples=MIN_SAMPLES):
+        self.client = async_client
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.recent = deque(maxlen=LATENCY_WINDOW)  # latencies that set the hedge delay
+        self.latencies = []  # every call's latency as seen by the caller
+        self.calls = self.hedged = self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="hedged-openai", daemon=True)
+        self._thread.start()
+
+    def create(self, **kwargs):
+        """Blocking chat.completions.create with hedging; safe to call from any thread.
+
+        Returns (response, hedged, won): whether a second request was sent,
+        and whether it was the one that answered.
+        """
+        return asyncio.run_coroutine_threadsafe(self._create(kwargs), self._loop).result()
+
+    def hedge_delay(self):
+        """Seconds to wait before hedging the next call, or None if it should not be hedged."""
+        with self._lock:
+            if len(self.recent) < self.min_samples:
+                return None
+            if (self.hedged + 1) / (self.calls + 1) > self.max_hedge_ratio:
+                return None
+            return percentile(self.recent, self.percentile)
+
+    async def _create(self, kwargs):
+        start = time.monotonic()
+        delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self.client.chat.completions.create(**kwargs))
+        hedge = None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    # Re-check the cap: other threads may have hedged while this one waited
+                    with self._lock:
+                        if (self.hedged + 1) / (self.calls + 1) <= self.max_hedge_ratio:
+                            self.hedged += 1
+                            hedge = asyncio.ensure_future(self.client.chat.completions.create(**kwargs))
+            pending = {primary} | ({hedge} if hedge else set())
+            response, winner = await self._first_success(pending)
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+        elapsed = time.monotonic() - start
+        with self._lock:
+            self.calls += 1
+            self.recent.append(elapsed)
+            self.latencies.append(elapsed)
+            won = hedge is not None and winner is hedge
+            self.hedge_wins += won
+        return response, hedge is not None, won
+
+    @staticmethod
+    async def _first_success(tasks):
+        """Result of the first task to succeed; raises the last error if all of them fail."""
+        error = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), task
+                error = task.exception()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "p50": percentile(self.latencies, 50),
+                "p99": percentile(self.latencies, 99),
+            }
+
+    def summary(self, extra_cost=None, base_cost=None):
+        """Run summary lines; `extra_cost` is what the cancelled requests cost on top of `base_cost`."""
+        stats = self.stats()
+        if not stats["calls"]:
+            return ["  hedging: no calls"]
+        lines = [
+            f"  hedging: {stats['hedged']}/{stats['calls']} calls hedged "
+            f"({stats['hedged'] / stats['calls']:.1%}, cap {self.max_hedge_ratio:.0%}), "
+            f"{stats['hedge_wins']} won by the hedge",
+            f"  latency: p50 {stats['p50']:.2f}s, p99 {stats['p99']:.2f}s",
+        ]
+        if extra_cost is not None:
+            line = f"  hedge spend: ${extra_cost:.4f} for cancelled requests"
+            if base_cost:
+                line += f" (+{extra_cost / base_cost:.1%} on top of the calls, bounded by the cap)"
+            lines.append(line)
+        return lines
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def _fake_server(base_latency, slow_latency, slow_share, seed):
+    """Local chat-completions endpoint; `slow_share` of requests take `slow_latency` instead."""
+    import json
+    import random
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    body = json.dumps({
+        "id": "chatcmpl-fake", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": '{"verdict": "good"}'}}],
+        "usage": {"prompt_tokens": 1000, "completion_tokens": 50, "total_tokens": 1050},
+    }).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with rng_lock:
+                slow = rng.random() < slow_share
+            time.sleep(slow_latency if slow else base_latency)
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except OSError:
+                pass  # the client cancelled this request
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark(calls=200, base_latency=0.05, slow_latency=1.0, slow_share=0.02,
+              hedge_percentile=DEFAULT_PERCENTILE, max_hedge_ratio=DEFAULT_MAX_HEDGE_RATIO, seed=1):
+    """Sequential calls against the fake server, once without and once with hedging."""
+    from openai import AsyncOpenAI
+
+    results = {}
+    for mode in ("unhedged", "hedged"):
+        server = _fake_server(base_latency, slow_latency, slow_share, seed)
+        client = AsyncOpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+        caller = HedgedCaller(client, percentile=hedge_percentile,
+                              max_hedge_ratio=max_hedge_ratio if mode == "hedged" else 0.0)
+        try:
+            for _ in range(calls):
+                caller.create(model="gpt-4o", messages=[{"role": "user", "content": "hi"}])
+            results[mode] = caller.stats()
+        finally:
+            caller.close()
+            server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Measure hedging against a local fake server with slow responses")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--base-latency", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    parser.add_argument("--slow-share", type=float, default=0.02, help="share of responses that are slow")
+    parser.add_argument("--percentile", type=float, default=DEFAULT_PERCENTILE)
+    parser.add_argument("--max-hedge-ratio", type=float, default=DEFAULT_MAX_HEDGE_RATIO)
+    args = parser.parse_args()
+
+    results = benchmark(args.calls, args.base_latency, args.slow_latency, args.slow_share,
+                        args.percentile, args.max_hedge_ratio)
+    for mode, stats in results.items():
+        print(f"{mode:<9} p50 {stats['p50']:.3f}s  p99 {stats['p99']:.3f}s  "
+              f"hedged {stats['hedged']}/{stats['calls']}  hedge wins {stats['hedge_wins']}")
+    before, after = results["unhedged"]["p99"], results["hedged"]["p99"]
+    print(f"p99 improvement: {before:.3f}s -> {after:.3f}s ({(before - after) / before:.0%} lower)")
@@ -0,0 +1,121 @@
+import os
+import base64
+import csv
+import html as html_lib
+import logging
+from datetime import datetime
+
+from verdict import CRITERIA, is_lead, overall_score
+from screenshot_store import image_mime
+
+logger = logging.getLogger(__name__)
+
+
+def generate_html_report(items, output_file):
+    logger.info(f"Generating HTML report to {output_file}")
+    html = [
+        "<html>",
+        "<head>",
+        "<meta charset='UTF-8'>",
+        "<title>Website Classification Report</title>",
+        "<style>",
+        "body { font-family: Arial, sans-serif; }",
+        "img { max-width: 600px; border: 1px solid #ccc; margin: 10px 0; vertical-align: top; }",
+        "img.mobile { max-width: 195px; margin-left: 10px; }",
+        "h2 { color: #333; }",
+        "table.scores td { padding: 2px 12px 2px 0; }",
+        "</style>",
+        "</head>",
+        "<body>",
+        "<h1>Website Classification Report</h1>",
+    ]
+
+    for item in items:
+        website = item["contact"]["website"]
+        screenshot_file = item.get("screenshot_file")
+        verdict = item["verdict"]
+        logger.debug(f"Adding report entry for {website}")
+        html.append(f"<h2>{html_lib.escape(website)}</h2>")
+        if screenshot_file and os.path.exists(screenshot_file):
+            # Read and encode the screenshot
+            with open(screenshot_file, "rb") as img_file:
+                encoded_img = base64.b64encode(img_file.read()).decode("utf-8")
+            html.append(f'<img src="data:{image_mime(screenshot_file)};base64,{encoded_img}" '
+                        f'alt="Screenshot of {html_lib.escape(website)}"/>')
+            mobile_file = item.get("mobile_screenshot_file")
+            if mobile_file and os.path.exists(mobile_file):
+                with open(mobile_file, "rb") as img_file:
+                    encoded_img = base64.b64encode(img_file.read()).decode("utf-8")
+                html.append(f'<img class="mobile" src="data:{image_mime(mobile_file)};base64,{encoded_img}" '
+                            f'alt="Mobile screenshot of {html_lib.escape(website)}"/>')
+        else:
+            logger.warning(f"Screenshot not found for {website}")
+            html.append("<p>[Screenshot not found]</p>")
+
+        score = overall_score(verdict)
+        html.append(
+            f"<p><strong>Classification:</strong> {verdict['verdict']} website"
+            + (f" (average score {score})" if score is not None else "")
+            + "</p>"
+        )
+        if verdict.get("scores"):
+            html.append("<table class='scores'>")
+            for name in CRITERIA:
+                html.append(f"<tr><td>{name.replace('_', ' ').title()}</td><td>{verdict['scores'][name]}/10</td></tr>")
+            html.append("</table>")
+        if verdict.get("summary"):
+            html.append("<ul>" + "".join(f"<li>{html_lib.escape(s)}</li>" for s in verdict["summary"]) + "</ul>")
+        if verdict.get("priority_fixes"):
+            html.append("<p><strong>Priority fixes:</strong></p>")
+            html.append("<ol>" + "".join(f"<li>{html_lib.escape(s)}</li>" for s in verdict["priority_fixes"]) + "</ol>")
+        html.append("<hr/>")
+
+    html.append("</body></html>")
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write("\n".join(html))
+    logger.info(f"HTML report generated: {output_file}")
+
+def write_csv_report(not_good_rows, csv_file, simplify_name=None):
+    logger.info(f"Writing CSV report to {csv_file}")
+    fieldnames = ["website", "company_name", "first_name", "last_name", "email", "location"]
+    try:
+        with open(csv_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in not_good_rows:
+                # Get simplified company name
+                if simplify_name:
+                    row["company_name"] = simplify_name(row.get("company_name", ""))
+                writer.writerow(row)
+        logger.info(f"CSV report generated: {csv_file}")
+    except Exception as e:
+        logger.error(f"Error writing CSV report: {str(e)}", exc_info=True)
+
+def lead_row(contact):
+    return {
+        "website": contact["website"],
+        "company_name": contact.get("company_name", ""),
+        "first_name": contact.get("first_name", ""),
+        "last_name": contact.get("last_name", ""),
+        "email": contact.get("email", ""),
+        "location": contact.get("location", "")
+    }
+
+def write_reports(items, threshold=None, simplify_name=None):
+    """Write the ng_<timestamp>.csv lead list and .html report for classified items.
+
+    Each item is a dict with "contact", "verdict" and "screenshot_file".
+    """
+    logger.info("Generating reports...")
+
+    # Generate timestamp for filenames
+    timestamp = datetime.now().strftime("%H-%M-%S_%m-%d-%Y")
+    csv_file = f"ng_{timestamp}.csv"
+    html_file = f"ng_{timestamp}.html"
+
+    not_good_rows = [lead_row(item["contact"]) for item in items if is_lead(item["verdict"], threshold)]
+    if not_good_rows:
+        write_csv_report(not_good_rows, csv_file, simplify_name=simplify_name)
+    generate_html_report(items, html_file)
+    return csv_file, html_file
@@ -0,0 +1,329 @@
+"""
+Indexed local store of classification results.
+
+Every verdict is kept in a SQLite table with one column per criterion
+score and indexes on run, list, domain, verdict and overall score, so
+past runs can be filtered, re-thresholded and re-reported in
+milliseconds instead of being re-classified.
+
+Usage:
+  python3 results_store.py runs
+  python3 results_store.py query [--run R] [--verdict "not good"] [--max-score 5] [--min mobile_optimization=7]
+  python3 results_store.py report --run R [--threshold 6]
+  python3 results_store.py costs [--run R] [--list-name L] [--by list]
+"""
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+from verdict import CRITERIA, is_lead, overall_score
+
+DEFAULT_RESULTS_DB = os.getenv("CLASSIFY_RESULTS_DB", "classification_results.db")
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_RESULTS_DB):
+        self.path = path
+        score_columns = ",\n".join(f"        score_{name} INTEGER" for name in CRITERIA)
+        conn = self._connect()
+        try:
+            conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run TEXT NOT NULL,
+                list_name TEXT,
+                website TEXT NOT NULL,
+                domain TEXT,
+                verdict TEXT NOT NULL,
+                overall REAL,
+{score_columns},
+                summary TEXT,
+                priority_fixes TEXT,
+                error TEXT,
+                screenshot_file TEXT,
+                mobile_screenshot_file TEXT,
+                contact TEXT,
+                classified_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_run ON results (run);
+            CREATE INDEX IF NOT EXISTS idx_results_list ON results (list_name);
+            CREATE INDEX IF NOT EXISTS idx_results_domain ON results (domain);
+            CREATE INDEX IF NOT EXISTS idx_results_verdict_overall ON results (verdict, overall);
+            CREATE INDEX IF NOT EXISTS idx_results_overall ON results (overall);
+
+            CREATE TABLE IF NOT EXISTS costs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run TEXT NOT NULL,
+                list_name TEXT,
+                stage TEXT NOT NULL,
+                model TEXT NOT NULL,
+                detail TEXT,
+                batch INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                recorded_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_costs_run ON costs (run);
+            CREATE INDEX IF NOT EXISTS idx_costs_list ON costs (list_name);
+            """)
+            # Databases created before mobile captures lack the column
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(results)")}
+            if "mobile_screenshot_file" not in columns:
+                conn.execute("ALTER TABLE results ADD COLUMN mobile_screenshot_file TEXT")
+            # One row per site and run; databases from before the unique index may hold copies
+            # from repeated reports, so they are deduplicated once when the index is added
+            has_unique_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_results_run_website'"
+            ).fetchone()
+            if not has_unique_index:
+                with conn:
+                    conn.execute("""
+                        DELETE FROM results WHERE id NOT IN (SELECT MAX(id) FROM results GROUP BY run, website)
+                    """)
+                    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_results_run_website ON results (run, website)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def add_many(self, run, list_name, items):
+        """Store a run's items (dicts with "contact", "verdict", "screenshot_file" and
+        optionally "mobile_screenshot_file"), replacing earlier rows for the same sites."""
+        now = datetime.now().isoformat()
+        columns = ["run", "list_name", "website", "domain", "verdict", "overall"]
+        columns += [f"score_{name}" for name in CRITERIA]
+        columns += ["summary", "priority_fixes", "error", "screenshot_file", "mobile_screenshot_file",
+                    "contact", "classified_at"]
+        rows = []
+        for item in items:
+            contact, verdict = item["contact"], item["verdict"]
+            scores = verdict.get("scores") or {}
+            rows.append(
+                [run, list_name, contact["website"], _domain(contact["website"]), verdict["verdict"], overall_score(verdict)]
+                + [scores.get(name) for name in CRITERIA]
+                + [
+                    json.dumps(verdict.get("summary", [])),
+                    json.dumps(verdict.get("priority_fixes", [])),
+                    verdict.get("error"),
+                    item.get("screenshot_file"),
+                    item.get("mobile_screenshot_file"),
+                    json.dumps(contact),
+                    now,
+                ]
+            )
+        # Re-reporting a run replaces its rows instead of adding copies
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in ("run", "website"))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                    f"ON CONFLICT (run, website) DO UPDATE SET {updates}",
+                    rows,
+                )
+        finally:
+            conn.close()
+        return len(rows)
+
+    def query(self, run=None, list_name=None, domain=None, verdict=None,
+              min_score=None, max_score=None, min_criteria=None, max_criteria=None):
+        """Return stored results matching every given filter, newest first."""
+        where, params = [], []
+        for column, value in (("run", run), ("list_name", list_name), ("domain", domain), ("verdict", verdict)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if min_score is not None:
+            where.append("overall >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            where.append("overall <= ?")
+            params.append(max_score)
+        for op, criteria in ((">=", min_criteria), ("<=", max_criteria)):
+            for name, value in (criteria or {}).items():
+                if name not in CRITERIA:
+                    raise ValueError(f"Unknown criterion: {name}")
+                where.append(f"score_{name} {op} ?")
+                params.append(value)
+
+        sql = "SELECT * FROM results"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC"
+        conn = self._connect()
+        try:
+            return [self._to_item(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def add_cost(self, run, list_name, stage, model, prompt_tokens, completion_tokens, cost,
+                 batch=False, detail=None):
+        """Record the token usage and cost of one API call."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO costs (run, list_name, stage, model, detail, batch, prompt_tokens, "
+                    "completion_tokens, cost, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (run, list_name, stage, model, detail, int(batch), prompt_tokens, completion_tokens,
+                     cost, datetime.now().isoformat()),
+                )
+        finally:
+            conn.close()
+
+    def run_cost(self, run):
+        """Total spend recorded for a run (by every worker)."""
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COALESCE(SUM(cost), 0) FROM costs WHERE run = ?", (run,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def cost_summary(self, run=None, list_name=None, by=("run", "stage")):
+        """Calls, tokens and cost grouped by any of run, list_name, stage, model."""
+        for column in by:
+            if column not in ("run", "list_name", "stage", "model"):
+                raise ValueError(f"Cannot group costs by {column}")
+        where, params = [], []
+        for column, value in (("run", run), ("list_name", list_name)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        columns = ", ".join(by)
+        sql = (f"SELECT {columns}, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+               f"SUM(completion_tokens) AS completion_tokens, SUM(cost) AS cost FROM costs")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" GROUP BY {columns} ORDER BY {columns}"
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def screenshot_files(self):
+        """Every desktop and mobile screenshot path a stored result refers to."""
+        conn = self._connect()
+        try:
+            files = set()
+            for desktop, mobile in conn.execute("SELECT screenshot_file, mobile_screenshot_file FROM results"):
+                files.update(filter(None, (desktop, mobile)))
+            return files
+        finally:
+            conn.close()
+
+    def runs(self):
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(
+                "SELECT run, list_name, COUNT(*) AS sites, SUM(verdict = 'not good') AS not_good, "
+                "ROUND(AVG(overall), 2) AS avg_score, MIN(classified_at) AS classified_at "
+                "FROM results GROUP BY run, list_name ORDER BY classified_at DESC"
+            )]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_item(row):
+        scores = {name: row[f"score_{name}"] for name in CRITERIA}
+        verdict = {
+            "verdict": row["verdict"],
+            "scores": scores if any(v is not None for v in scores.values()) else None,
+            "summary": json.loads(row["summary"] or "[]"),
+            "priority_fixes": json.loads(row["priority_fixes"] or "[]"),
+        }
+        if row["error"]:
+            verdict["error"] = row["error"]
+        return {
+            "run": row["run"],
+            "list_name": row["list_name"],
+            "contact": json.loads(row["contact"] or "{}"),
+            "verdict": verdict,
+            "overall": row["overall"],
+            "screenshot_file": row["screenshot_file"],
+            "mobile_screenshot_file": row["mobile_screenshot_file"],
+            "classified_at": row["classified_at"],
+        }
+
+
+def _domain(url):
+    domain = (url or "").lower().replace("https://", "").replace("http://", "").replace("www.", "")
+    return domain.split("/")[0]
+
+
+def _criteria_args(values):
+    criteria = {}
+    for value in values or []:
+        name, _, score = value.partition("=")
+        criteria[name] = int(score)
+    return criteria
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query stored website classification results")
+    parser.add_argument("--db", default=DEFAULT_RESULTS_DB)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("runs", help="list stored runs")
+    costs = sub.add_parser("costs", help="token usage and cost per run, stage or list")
+    costs.add_argument("--run")
+    costs.add_argument("--list-name")
+    costs.add_argument("--by", choices=["run", "stage", "list", "model"], action="append",
+                       help="group by (repeatable, default: run and stage)")
+
+    for name in ("query", "report"):
+        p = sub.add_parser(name)
+        p.add_argument("--run")
+        p.add_argument("--list-name")
+        p.add_argument("--domain")
+        p.add_argument("--verdict", choices=["good", "not good"])
+        p.add_argument("--min-score", type=float, help="minimum average score")
+        p.add_argument("--max-score", type=float, help="maximum average score")
+        p.add_argument("--min", action="append", metavar="CRITERION=N", help="minimum score for one criterion")
+        p.add_argument("--max", action="append", metavar="CRITERION=N", help="maximum score for one criterion")
+        p.add_argument("--threshold", type=float,
+                       help="also count 'good' sites averaging below this score as leads")
+    args = parser.parse_args()
+    store = ResultsStore(args.db)
+
+    if args.command == "runs":
+        for run in store.runs():
+            print(f"{run['run']}\t{run['list_name']}\t{run['sites']} sites\t{run['not_good']} not good\t"
+                  f"avg {run['avg_score']}\t{run['classified_at']}")
+        return
+
+    if args.command == "costs":
+        by = tuple("list_name" if b == "list" else b for b in (args.by or ["run", "stage"]))
+        total = 0.0
+        for row in store.cost_summary(run=args.run, list_name=args.list_name, by=by):
+            keys = "\t".join(str(row[column]) for column in by)
+            print(f"{keys}\t{row['calls']} calls\t{row['prompt_tokens']:,} in\t"
+                  f"{row['completion_tokens']:,} out\t${row['cost']:.4f}")
+            total += row["cost"]
+        print(f"Total: ${total:.4f}")
+        return
+
+    items = store.query(
+        run=args.run, list_name=args.list_name, domain=args.domain, verdict=args.verdict,
+        min_score=args.min_score, max_score=args.max_score,
+        min_criteria=_criteria_args(args.min), max_criteria=_criteria_args(args.max),
+    )
+    if args.command == "query":
+        for item in items:
+            lead = "lead" if is_lead(item["verdict"], args.threshold) else "-"
+            print(f"{item['contact'].get('website')}\t{item['verdict']['verdict']}\t{item['overall']}\t{lead}\t{item['run']}")
+        print(f"{len(items)} results")
+        return
+
+    from reports import write_reports
+    write_reports(items, threshold=args.threshold)
+
+
+if __name__ == "__main__":
+    main()
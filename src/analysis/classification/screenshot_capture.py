@@ -1,40 +1,269 @@
 #screenshot_capture.py
 
+import os
 import time
+import logging
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.by import By
 
-def capture_screenshot(url, output_path="screenshot.png"):
+logger = logging.getLogger(__name__)
+
+# Hard limit on load + readiness wait; the screenshot is taken at this point whatever the page state
+READY_TIMEOUT = float(os.getenv("SCREENSHOT_READY_TIMEOUT", "15"))
+# The page counts as settled once no request finished and the DOM/layout did not change for this long
+NETWORK_IDLE_MS = int(os.getenv("SCREENSHOT_NETWORK_IDLE_MS", "500"))
+DOM_STABLE_MS = int(os.getenv("SCREENSHOT_DOM_STABLE_MS", "500"))
+POLL_INTERVAL = 0.1
+
+# Also capture a mobile view after the desktop one, from the same page load
+CAPTURE_MOBILE = os.getenv("SCREENSHOT_MOBILE", "1") != "0"
+# iPhone 12-14 sized viewport. Scale factor 1 keeps the image at 390px wide, which is
+# legible to the model and costs a quarter of the vision tokens of a 2x capture.
+MOBILE_METRICS = {"width": 390, "height": 844, "deviceScaleFactor": 1, "mobile": True}
+# Extra time allowed for the page to reflow after switching to the mobile viewport
+MOBILE_SETTLE_TIMEOUT = 3.0
+
+# Resource groups blocked through CDP, comma separated. "fonts" is available but off by
+# default because web fonts change the typography the classifier is judging.
+BLOCK = os.getenv("SCREENSHOT_BLOCK", "media,analytics")
+
+BLOCK_PATTERNS = {
+    "media": ["*.mp4", "*.webm", "*.ogg", "*.ogv", "*.mov", "*.m4v", "*.m3u8", "*.mpd", "*.mp3", "*.wav"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"],
+    "analytics": [
+        "*google-analytics.com*",
+        "*googletagmanager.com*",
+        "*doubleclick.net*",
+        "*googleadservices.com*",
+        "*connect.facebook.net*",
+        "*hotjar.com*",
+        "*segment.com*",
+        "*segment.io*",
+        "*clarity.ms*",
+        "*mixpanel.com*",
+        "*fullstory.com*",
+        "*hs-analytics.net*",
+        "*bat.bing.com*",
+        "*snap.licdn.com*",
+        "*analytics.tiktok.com*",
+        "*quantserve.com*",
+        "*scorecardresearch.com*",
+    ],
+}
+
+# Installed before any page script runs: counts in-flight fetch/XHR requests and
+# remembers when the last request finished and when the DOM last changed.
+READINESS_SCRIPT = """
+(function () {
+  if (window.__capture) return;
+  var state = window.__capture = {inflight: 0, lastNetwork: Date.now(), lastMutation: Date.now()};
+  function done() { state.inflight = Math.max(0, state.inflight - 1); state.lastNetwork = Date.now(); }
+  if (window.fetch) {
+    var fetch = window.fetch;
+    window.fetch = function () {
+      state.inflight++;
+      return fetch.apply(window, arguments).then(
+        function (r) { done(); return r; }, function (e) { done(); throw e; });
+    };
+  }
+  var send = XMLHttpRequest.prototype.send;
+  XMLHttpRequest.prototype.send = function () {
+    state.inflight++;
+    this.addEventListener('loadend', done);
+    return send.apply(this, arguments);
+  };
+  try {
+    new PerformanceObserver(function () { state.lastNetwork = Date.now(); })
+      .observe({type: 'resource', buffered: true});
+  } catch (e) {}
+  // Content changes only: style/class churn from carousels, tickers and CSS animations
+  // never stops, so watching every attribute would keep busy pages from ever settling
+  new MutationObserver(function () { state.lastMutation = Date.now(); })
+    .observe(document, {childList: true, subtree: true, characterData: true,
+                        attributes: true, attributeFilter: ['src', 'srcset']});
+})();
+"""
+
+# Returns the page state polled by wait_until_ready
+PROBE_SCRIPT = """
+var s = window.__capture;
+var body = document.body;
+var pendingImages = 0;
+for (var i = 0; i < document.images.length; i++) {
+  var img = document.images[i];
+  if (!img.complete && img.getBoundingClientRect().top < window.innerHeight) pendingImages++;
+}
+var visual = body ? body.querySelectorAll('img, svg, canvas, video, picture, iframe').length : 0;
+return {
+  readyState: document.readyState,
+  inflight: s ? s.inflight : 0,
+  sinceNetwork: s ? Date.now() - s.lastNetwork : null,
+  sinceMutation: s ? Date.now() - s.lastMutation : null,
+  height: body ? body.scrollHeight : 0,
+  hasContent: !!body && ((body.innerText || '').trim().length > 0 || visual > 0),
+  pendingImages: pendingImages
+};
+"""
+
+
+def blocked_url_patterns(block=BLOCK):
+    groups = [group.strip() for group in (block or "").split(",") if group.strip()]
+    patterns = []
+    for group in groups:
+        if group not in BLOCK_PATTERNS:
+            raise ValueError(f"Unknown block group '{group}' (choose from {', '.join(BLOCK_PATTERNS)})")
+        patterns += BLOCK_PATTERNS[group]
+    return patterns
+
+
+def prepare_page(driver, block=BLOCK):
+    """Install the readiness hooks and URL blocking before the first navigation."""
+    try:
+        driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": READINESS_SCRIPT})
+        patterns = blocked_url_patterns(block)
+        if patterns:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except WebDriverException as e:
+        # Not a Chromium driver: readiness hooks are installed after load instead
+        logger.warning(f"CDP unavailable, capturing without resource blocking: {e}")
+
+
+def wait_until_ready(driver, deadline):
+    """Poll until the network is idle and the DOM and layout are stable, or the deadline passes.
+
+    Returns the reason the wait ended: "ready" or "timeout".
+    """
+    last_height = None
+    stable_since = time.time()
+    while time.time() < deadline:
+        try:
+            state = driver.execute_script(PROBE_SCRIPT)
+        except WebDriverException:
+            time.sleep(POLL_INTERVAL)
+            continue
+        if state["sinceNetwork"] is None:
+            # Hooks missing (no CDP, or the page replaced them); install them now and keep polling
+            try:
+                driver.execute_script(READINESS_SCRIPT)
+            except WebDriverException:
+                pass
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        now = time.time()
+        if state["height"] != last_height:
+            last_height = state["height"]
+            stable_since = now
+        if (
+            state["readyState"] == "complete"
+            and state["hasContent"]
+            and state["inflight"] == 0
+            and state["pendingImages"] == 0
+            and state["sinceNetwork"] >= NETWORK_IDLE_MS
+            and state["sinceMutation"] >= DOM_STABLE_MS
+            and (now - stable_since) * 1000 >= DOM_STABLE_MS
+        ):
+            return "ready"
+        time.sleep(POLL_INTERVAL)
+    return "timeout"
+
+
+def mobile_screenshot_path(output_path):
+    """Where the mobile view of `output_path` is saved: screenshot_1.png -> screenshot_1_mobile.png"""
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_mobile{ext or '.png'}"
+
+
+def capture_mobile_view(driver, output_path, deadline):
+    """Re-lay out the already loaded page at phone size via CDP and screenshot it.
+
+    Returns None instead of raising if the mobile view cannot be captured, so
+    the desktop capture that already succeeded is kept.
+    """
+    try:
+        driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", MOBILE_METRICS)
+        driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {"enabled": True, "maxTouchPoints": 5})
+    except WebDriverException as e:
+        logger.warning(f"Device emulation unavailable, skipping mobile capture: {e}")
+        return None
+    try:
+        # Media queries and resize handlers run now; wait for the new layout to settle
+        wait_until_ready(driver, deadline)
+        driver.save_screenshot(output_path)
+        return output_path
+    except WebDriverException as e:
+        logger.warning(f"Mobile capture failed, keeping the desktop view only: {e}")
+        return None
+    finally:
+        try:
+            driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+        except WebDriverException:
+            pass  # the tab or session is gone; driver.quit() cleans up
+
+
+def capture_screenshot(url, output_path="screenshot.png", ready_timeout=READY_TIMEOUT, block=BLOCK,
+                       mobile=CAPTURE_MOBILE):
     """
     Launches a headless Chrome browser to navigate to the given URL and takes a screenshot.
-    
+
+    Waits for network idle and a stable DOM/layout (at most `ready_timeout` seconds
+    including the page load) and blocks the resource groups listed in `block`.
+    With `mobile`, the same page is then emulated at phone size and saved as
+    mobile_screenshot_path(output_path) without navigating again.
+
     :param url: The URL of the website to capture.
     :param output_path: The filename where the screenshot will be saved.
+    :return: dict with "readiness" ("ready" or "timeout"), "elapsed" seconds and
+             "mobile_path" (None if no mobile view was captured).
     """
     options = webdriver.ChromeOptions()
     options.add_argument("--headless")  # Run in headless mode.
     options.add_argument("--window-size=1280,800")  # Set a fixed window size.
-    
+    # Return from get() at DOMContentLoaded; wait_until_ready decides when the page is done
+    options.page_load_strategy = "eager"
+
     # Initialize the Chrome driver.
     driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
-    
+
+    start = time.time()
+    deadline = start + ready_timeout
     try:
-        driver.get(url)
-        # Wait for body to be present instead of arbitrary sleep
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
+        prepare_page(driver, block)
+        driver.set_page_load_timeout(ready_timeout)
+        try:
+            driver.get(url)
+        except TimeoutException:
+            # Still loading at the deadline: stop it and capture what has rendered
+            driver.execute_script("window.stop();")
+            readiness = "timeout"
+        else:
+            readiness = wait_until_ready(driver, deadline)
         driver.save_screenshot(output_path)
+
+        mobile_path = None
+        if mobile:
+            mobile_path = capture_mobile_view(
+                driver, mobile_screenshot_path(output_path), time.time() + MOBILE_SETTLE_TIMEOUT
+            )
     finally:
         driver.quit()
 
+    elapsed = time.time() - start
+    if readiness == "timeout":
+        logger.warning(f"{url} not settled after {ready_timeout:.0f}s; captured anyway")
+    logger.info(f"Captured {url} in {elapsed:.2f}s ({readiness}{', with mobile view' if mobile_path else ''})")
+    return {"readiness": readiness, "elapsed": elapsed, "mobile_path": mobile_path}
+
 # For standalone testing (optional)
 if __name__ == "__main__":
-    test_url = "https://example.com"
-    capture_screenshot(test_url)
-    print(f"Screenshot captured and saved as screenshot.png")
+    import sys
+    test_url = sys.argv[1] if len(sys.argv) > 1 else "https://example.com"
+    logging.basicConfig(level=logging.INFO)
+    result = capture_screenshot(test_url)
+    print(f"Screenshot captured and saved as screenshot.png ({result['readiness']} in {result['elapsed']:.2f}s)")
+    if result["mobile_path"]:
+        print(f"Mobile view saved as {result['mobile_path']}")
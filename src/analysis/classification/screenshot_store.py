@@ -0,0 +1,264 @@
+"""
+Content-addressed screenshot store.
+
+Captures are saved once under objects/<hh>/<sha256>.webp, named by the
+hash of the captured PNG. A site that looks the same as last time, or a
+capture repeated across runs, therefore costs no extra disk. Images are
+re-encoded as WebP when Pillow with WebP support is installed; otherwise
+the PNG is kept as is. index.jsonl maps each domain to its captures and
+`latest()` returns the newest one per view (desktop/mobile).
+
+`gc` deletes objects that no stored result, queued task result, batch
+state file or latest-index entry refers to, and compacts the index. It
+holds an exclusive lock on index.lock while it runs; `put` holds a shared
+one, so captures stored during a gc are neither deleted nor dropped from
+the index.
+
+Usage:
+  python3 screenshot_store.py stats
+  python3 screenshot_store.py latest example.com
+  python3 screenshot_store.py gc [--dry-run] [--results-db DB] [--queue URL] [--batch-states GLOB]
+"""
+import argparse
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    from PIL import Image, features
+    WEBP_AVAILABLE = features.check("webp")
+except ImportError:
+    WEBP_AVAILABLE = False
+
+DEFAULT_SCREENSHOT_STORE = os.getenv("SCREENSHOT_STORE_DIR", "screenshot_store")
+WEBP_QUALITY = int(os.getenv("SCREENSHOT_WEBP_QUALITY", "80"))
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = "index.lock"
+
+MIME_TYPES = {".png": "image/png", ".webp": "image/webp", ".jpg": "image/jpeg", ".jpeg": "image/jpeg"}
+
+
+def image_mime(path):
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), "image/png")
+
+
+def object_hash(path):
+    """Content hash of a stored object, taken from its file name."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _domain(url):
+    domain = (url or "").lower().replace("https://", "").replace("http://", "").replace("www.", "")
+    return domain.split("/")[0]
+
+
+class ScreenshotStore:
+    def __init__(self, root=DEFAULT_SCREENSHOT_STORE):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self.lock_path = os.path.join(root, LOCK_FILE)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def scratch_path(self, suffix=".png"):
+        """A unique path for the browser to write a capture to before it is stored."""
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        """Hold index.lock; shared for storing captures, exclusive for gc."""
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def put(self, image_file, url, view="desktop"):
+        """Store a captured PNG and record it as the latest `view` of the URL's domain.
+
+        Returns the path of the stored object; identical captures share one object.
+        """
+        with open(image_file, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        ext = ".webp" if WEBP_AVAILABLE else ".png"
+        path = self.object_path(digest, ext)
+        # gc must not delete the object between the existence check and the index append
+        with self._locked():
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = self.scratch_path(ext)
+                if WEBP_AVAILABLE:
+                    with Image.open(image_file) as image:
+                        image.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                else:
+                    shutil.copyfile(image_file, tmp)
+                os.replace(tmp, path)
+            self._append_index({
+                "domain": _domain(url),
+                "url": url,
+                "view": view,
+                "hash": digest,
+                "file": path,
+                "captured_at": datetime.now().isoformat(),
+            })
+        return path
+
+    def _append_index(self, entry):
+        # One short line per O_APPEND write, so concurrent workers do not interleave entries
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _index_entries(self):
+        if not os.path.exists(self.index_path):
+            return []
+        entries = []
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def latest_entries(self):
+        """{(domain, view): newest index entry}"""
+        latest = {}
+        for entry in self._index_entries():
+            latest[(entry["domain"], entry["view"])] = entry
+        return latest
+
+    def latest(self, domain_or_url, view="desktop"):
+        """Path of the newest capture of a domain, or None."""
+        entry = self.latest_entries().get((_domain(domain_or_url), view))
+        if entry and os.path.exists(entry["file"]):
+            return entry["file"]
+        return None
+
+    def objects(self):
+        return glob.glob(os.path.join(self.objects_dir, "*", "*"))
+
+    def gc(self, referenced, min_age_hours=1.0, dry_run=False):
+        """Delete objects not in `referenced` (paths or hashes) nor latest in the index.
+
+        Objects newer than `min_age_hours` are kept so a capture whose result has
+        not been saved yet is never removed. Returns (removed, freed_bytes).
+        """
+        with self._locked(exclusive=True):
+            return self._gc(referenced, min_age_hours, dry_run)
+
+    def _gc(self, referenced, min_age_hours, dry_run):
+        latest = self.latest_entries()
+        keep = {object_hash(ref) for ref in referenced if ref}
+        keep |= {entry["hash"] for entry in latest.values()}
+        cutoff = time.time() - min_age_hours * 3600
+
+        removed = freed = 0
+        for path in self.objects():
+            if object_hash(path) in keep or os.path.getmtime(path) > cutoff:
+                continue
+            size = os.path.getsize(path)
+            if not dry_run:
+                os.remove(path)
+            removed += 1
+            freed += size
+
+        # Abandoned scratch captures from crashed workers
+        for path in glob.glob(os.path.join(self.tmp_dir, "*")):
+            if os.path.getmtime(path) < cutoff:
+                freed += os.path.getsize(path)
+                if not dry_run:
+                    os.remove(path)
+
+        if not dry_run:
+            # Only the latest entry per domain and view is worth keeping in the index
+            tmp = self.index_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in latest.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp, self.index_path)
+        return removed, freed
+
+    def stats(self):
+        objects = self.objects()
+        return {
+            "objects": len(objects),
+            "bytes": sum(os.path.getsize(path) for path in objects),
+            "domains": len({domain for domain, _ in self.latest_entries()}),
+            "format": "webp" if WEBP_AVAILABLE else "png",
+        }
+
+
+def referenced_screenshots(results_db=None, queue_url=None, batch_states=()):
+    """Every screenshot path referred to by stored results, queued task results and batch state files."""
+    refs = set()
+    if results_db and os.path.exists(results_db):
+        from results_store import ResultsStore
+        refs |= ResultsStore(results_db).screenshot_files()
+    if queue_url:
+        from work_queue import open_queue
+        queue = open_queue(queue_url)
+        for run in queue.runs():
+            for _, _, result in queue.results(run):
+                refs.add(result.get("screenshot_file"))
+                refs.add(result.get("mobile_screenshot_file"))
+    for pattern in batch_states:
+        for state_file in glob.glob(pattern):
+            with open(state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            for item in state.get("items", {}).values():
+                refs.add(item.get("screenshot_file"))
+                refs.add(item.get("mobile_screenshot_file"))
+    refs.discard(None)
+    return refs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the content-addressed screenshot store")
+    parser.add_argument("--store", default=DEFAULT_SCREENSHOT_STORE)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="object count and disk usage")
+    latest = sub.add_parser("latest", help="newest capture of a domain")
+    latest.add_argument("domain")
+    latest.add_argument("--view", default="desktop", choices=["desktop", "mobile"])
+    gc = sub.add_parser("gc", help="delete captures nothing refers to any more")
+    gc.add_argument("--results-db", default=os.getenv("CLASSIFY_RESULTS_DB", "classification_results.db"))
+    gc.add_argument("--queue", default=os.getenv("CLASSIFY_QUEUE", "sqlite:///classification_queue.db"))
+    gc.add_argument("--batch-states", action="append", metavar="GLOB",
+                    help="batch state files to keep captures for (default: */batch_*.json)")
+    gc.add_argument("--min-age-hours", type=float, default=1.0, help="never delete objects newer than this")
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    store = ScreenshotStore(args.store)
+    if args.command == "stats":
+        stats = store.stats()
+        print(f"{stats['objects']} objects, {stats['bytes'] / 1024 / 1024:.1f} MB, "
+              f"{stats['domains']} domains ({stats['format']})")
+    elif args.command == "latest":
+        print(store.latest(args.domain, args.view) or "no capture")
+    else:
+        queue_url = args.queue
+        if queue_url.startswith("sqlite:///") and not os.path.exists(queue_url[len("sqlite:///"):]):
+            queue_url = None  # no queue database yet, so nothing queued refers to anything
+        refs = referenced_screenshots(args.results_db, queue_url, args.batch_states or ["*/batch_*.json"])
+        removed, freed = store.gc(refs, min_age_hours=args.min_age_hours, dry_run=args.dry_run)
+        action = "Would remove" if args.dry_run else "Removed"
+        print(f"{action} {removed} unreferenced objects ({freed / 1024 / 1024:.1f} MB); {len(refs)} referenced")
+
+
+if __name__ == "__main__":
+    main()
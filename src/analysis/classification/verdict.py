@@ -0,0 +1,161 @@
+"""
+Structured website verdicts.
+
+The model answers with JSON matching VERDICT_SCHEMA: an overall verdict
+plus a 1-10 score for each of the eight criteria in the classification
+prompt. Responses are validated with `parse_verdict` as soon as they
+arrive, so a malformed answer is caught once instead of being
+string-matched downstream.
+"""
+import json
+
+VERDICTS = ("good", "not good")
+
+# Keys of the eight criteria in CLASSIFICATION_SYSTEM_PROMPT, in prompt order
+CRITERIA = (
+    "visual_design",
+    "layout_structure",
+    "navigation_accessibility",
+    "interactivity_engagement",
+    "modern_trends",
+    "conversion_optimization",
+    "mobile_optimization",
+    "ux_performance",
+)
+
+MIN_SCORE = 1
+MAX_SCORE = 10
+
+# "verdict" comes first so it is the first thing the model generates
+VERDICT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": {"type": "string", "enum": list(VERDICTS)},
+        "scores": {
+            "type": "object",
+            "properties": {name: {"type": "integer"} for name in CRITERIA},
+            "required": list(CRITERIA),
+            "additionalProperties": False,
+        },
+        "summary": {"type": "array", "items": {"type": "string"}},
+        "priority_fixes": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["verdict", "scores", "summary", "priority_fixes"],
+    "additionalProperties": False,
+}
+
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "website_verdict", "strict": True, "schema": VERDICT_SCHEMA},
+}
+
+# First pass of the model cascade: the same verdict plus the model's confidence in it (0-1)
+SCREENING_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "verdict": VERDICT_SCHEMA["properties"]["verdict"],
+        "confidence": {"type": "number"},
+        **{key: value for key, value in VERDICT_SCHEMA["properties"].items() if key != "verdict"},
+    },
+    "required": ["verdict", "confidence", "scores", "summary", "priority_fixes"],
+    "additionalProperties": False,
+}
+
+SCREENING_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "website_screening", "strict": True, "schema": SCREENING_SCHEMA},
+}
+
+
+class VerdictError(ValueError):
+    """The model's answer is not a valid verdict."""
+
+
+def parse_verdict(text):
+    """Parse and validate a JSON verdict. Raises VerdictError if it is malformed."""
+    try:
+        data = json.loads(text)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise VerdictError(f"Response is not valid JSON: {e}")
+    if not isinstance(data, dict):
+        raise VerdictError("Response is not a JSON object")
+
+    verdict = data.get("verdict")
+    if verdict not in VERDICTS:
+        raise VerdictError(f"Unknown verdict: {verdict!r}")
+
+    scores = data.get("scores")
+    if not isinstance(scores, dict):
+        raise VerdictError("Missing scores")
+    missing = [name for name in CRITERIA if name not in scores]
+    if missing:
+        raise VerdictError(f"Missing scores for: {', '.join(missing)}")
+    for name in CRITERIA:
+        score = scores[name]
+        if isinstance(score, bool) or not isinstance(score, int) or not MIN_SCORE <= score <= MAX_SCORE:
+            raise VerdictError(f"Score for {name} must be an integer {MIN_SCORE}-{MAX_SCORE}, got {score!r}")
+
+    def string_list(key):
+        value = data.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise VerdictError(f"{key} must be a list of strings")
+        return value
+
+    parsed = {
+        "verdict": verdict,
+        "scores": {name: scores[name] for name in CRITERIA},
+        "summary": string_list("summary"),
+        "priority_fixes": string_list("priority_fixes"),
+    }
+    if "confidence" in data:
+        confidence = data["confidence"]
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+            raise VerdictError(f"Confidence must be a number 0-1, got {confidence!r}")
+        parsed["confidence"] = float(confidence)
+    return parsed
+
+
+def failed_verdict(reason):
+    """Verdict used when a site could not be analysed (it is treated as a lead, as before)."""
+    return {
+        "verdict": "not good",
+        "scores": None,
+        "summary": [reason],
+        "priority_fixes": [],
+        "error": reason,
+    }
+
+
+def legacy_verdict(text):
+    """Wrap an old free-text classification ('good website' / 'not good website' + bullets)."""
+    lines = [line.strip() for line in (text or "").splitlines() if line.strip()]
+    verdict = "not good" if lines and "not good" in lines[0].lower() else "good"
+    return {
+        "verdict": verdict,
+        "scores": None,
+        "summary": [line.lstrip("-• ").strip() for line in lines[1:]],
+        "priority_fixes": [],
+    }
+
+
+def as_verdict(value):
+    """Accept either a verdict dict or a legacy free-text classification."""
+    return value if isinstance(value, dict) else legacy_verdict(value)
+
+
+def overall_score(verdict):
+    scores = verdict.get("scores")
+    if not scores:
+        return None
+    return round(sum(scores.values()) / len(scores), 2)
+
+
+def is_lead(verdict, threshold=None):
+    """A site is a lead if it was judged 'not good' or, with a threshold, scores below it."""
+    if verdict["verdict"] == "not good":
+        return True
+    if threshold is not None:
+        score = overall_score(verdict)
+        return score is not None and score < threshold
+    return False
+
@@ -0,0 +1,94 @@
+"""
+Streamed verdicts with early termination.
+
+With stream=True the JSON verdict arrives a few tokens at a time, and
+"verdict" and "scores" are generated first (see VERDICT_SCHEMA). They are
+all a lead decision needs, so VerdictStream reads only until both are
+complete:
+
+- a 'good' site is decided there and the stream is closed, which stops
+  generation of the summary and fixes nobody reads for good sites;
+- a 'not good' site is decided there as well, and the rest of the answer
+  (summary and priority fixes for the report) is read afterwards,
+  typically on a background thread.
+
+The scores are kept even for good sites because --threshold can still
+make a low-scoring 'good' site a lead.
+"""
+import json
+import re
+
+from verdict import VerdictError, parse_verdict
+
+VERDICT_PATTERN = re.compile(r'"verdict"\s*:\s*"(good|not good)"')
+# Scores are a flat object of integers, so the first "}" after it closes it
+SCORES_PATTERN = re.compile(r'"scores"\s*:\s*(\{[^{}]*\})')
+
+
+def partial_verdict(text):
+    """Verdict and scores from the start of a streamed answer, or None until both are complete and valid."""
+    verdict = VERDICT_PATTERN.search(text)
+    scores = SCORES_PATTERN.search(text)
+    if not verdict or not scores:
+        return None
+    try:
+        return parse_verdict(json.dumps({"verdict": verdict.group(1), "scores": json.loads(scores.group(1))}))
+    except (json.JSONDecodeError, VerdictError):
+        # Leave it to the full answer to fail properly
+        return None
+
+
+class VerdictStream:
+    """Reads a streamed chat completion whose content is a JSON verdict."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = iter(stream)
+        self.text = ""
+        self.content_chunks = 0  # about one token each; counts output when the stream is cut short
+        self.usage = None        # only sent in the final chunk (stream_options include_usage)
+        self.finished = False
+
+    def _read_chunk(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.finished = True
+            return False
+        if chunk.usage is not None:
+            self.usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.delta.content:
+                self.text += choice.delta.content
+                self.content_chunks += 1
+        return True
+
+    def read_decision(self):
+        """Read until verdict and scores are known and return them as a verdict without summary.
+
+        Returns None if the answer ended without a usable verdict; read_rest() then raises the reason.
+        """
+        while True:
+            decision = partial_verdict(self.text)
+            if decision is not None:
+                return decision
+            if not self._read_chunk():
+                return None
+
+    def read_rest(self):
+        """Read the rest of the answer and return the full verdict. Raises VerdictError if it is malformed."""
+        while self._read_chunk():
+            pass
+        if not self.text:
+            raise VerdictError("Empty response from API")
+        return parse_verdict(self.text)
+
+    def close(self):
+        """Stop reading; closing the connection ends generation on the server."""
+        self.stream.close()
+
+    def usage_tokens(self, prompt_tokens_estimate):
+        """Usage reported by the API, or an estimate for a stream closed before the usage chunk."""
+        if self.usage is not None:
+            return self.usage
+        return {"prompt_tokens": prompt_tokens_estimate, "completion_tokens": self.content_chunks}
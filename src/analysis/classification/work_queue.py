@@ -0,0 +1,242 @@
+"""
+Durable task queue for spreading website classification over many workers.
+
+Apollo ingestion enqueues one task per contact; any number of worker
+processes lease tasks, classify them and ack the result. A lease that is
+not acked within its visibility timeout (the worker crashed or hung)
+makes the task available again, and a worker that hits a transient
+error gives the task back with `fail` so it is retried. Reporting reads
+the aggregated results once the run is drained.
+
+Backends are picked by URL scheme through `open_queue`; `sqlite:///path`
+is built in and other backends can be added with `register_backend`.
+The SQLite backend relies on WAL mode, which needs shared memory, so it
+only works for workers on a single host: do not put the database on a
+network filesystem. Spreading workers over several machines needs a
+networked backend registered for its own scheme.
+"""
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+
+
+@dataclass
+class Task:
+    id: int
+    run: str
+    key: str
+    payload: dict
+    attempts: int
+    lease_token: str
+
+
+class WorkQueue:
+    """Interface every queue backend implements."""
+
+    # Leases a task gets before fail() (or an expired lease) marks it failed for good
+    max_attempts = 3
+
+    def enqueue(self, run, items):
+        """Add (key, payload) pairs to a run. Keys already in the run are skipped.
+
+        Returns the number of tasks actually added.
+        """
+        raise NotImplementedError
+
+    def lease(self, run, worker_id, visibility_timeout=600):
+        """Lease the next available task of a run, or return None."""
+        raise NotImplementedError
+
+    def ack(self, task, result):
+        """Mark a leased task done. Returns False if the lease was lost."""
+        raise NotImplementedError
+
+    def fail(self, task, error):
+        """Give a leased task back (or mark it failed after too many attempts)."""
+        raise NotImplementedError
+
+    def results(self, run):
+        """Return [(key, payload, result)] for every finished task of a run."""
+        raise NotImplementedError
+
+    def counts(self, run):
+        """Return a {status: count} dict for a run."""
+        raise NotImplementedError
+
+    def runs(self):
+        """Return the names of every run in the queue."""
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """Queue kept in a local SQLite file (WAL mode: safe across processes on one host only)."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        run TEXT NOT NULL,
+        key TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        lease_token TEXT,
+        leased_by TEXT,
+        lease_expires REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        UNIQUE (run, key)
+    );
+    CREATE INDEX IF NOT EXISTS idx_tasks_available ON tasks (run, status, lease_expires);
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.executescript(self.SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def enqueue(self, run, items):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            added = 0
+            for key, payload in items:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO tasks (run, key, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (run, key, json.dumps(payload), now, now),
+                )
+                added += cursor.rowcount
+            conn.execute("COMMIT")
+            return added
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def lease(self, run, worker_id, visibility_timeout=600):
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Expired leases that used up their attempts will not be handed out again
+            conn.execute(
+                "UPDATE tasks SET status = 'failed', error = 'lease expired too many times', updated_at = ? "
+                "WHERE run = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, run, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, key, payload, attempts FROM tasks "
+                "WHERE run = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "ORDER BY id LIMIT 1",
+                (run, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            task_id, key, payload, attempts = row
+            token = uuid.uuid4().hex
+            conn.execute(
+                "UPDATE tasks SET status = 'leased', lease_token = ?, leased_by = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (token, worker_id, now + visibility_timeout, now, task_id),
+            )
+            conn.execute("COMMIT")
+            return Task(task_id, run, key, json.loads(payload), attempts + 1, token)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def ack(self, task, result):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (json.dumps(result), time.time(), task.id, task.lease_token),
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def fail(self, task, error):
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ?, lease_token = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                (self.max_attempts, str(error), time.time(), task.id, task.lease_token),
+            )
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def results(self, run):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT key, payload, result FROM tasks WHERE run = ? AND status = 'done' ORDER BY id",
+                (run,),
+            ).fetchall()
+            return [(key, json.loads(payload), json.loads(result)) for key, payload, result in rows]
+        finally:
+            conn.close()
+
+    def counts(self, run):
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM tasks WHERE run = ? GROUP BY status", (run,)
+            ).fetchall()
+            return dict(rows)
+        finally:
+            conn.close()
+
+    def runs(self):
+        conn = self._connect()
+        try:
+            return [run for (run,) in conn.execute("SELECT DISTINCT run FROM tasks ORDER BY run")]
+        finally:
+            conn.close()
+
+
+BACKENDS = {
+    "sqlite": lambda location: SQLiteWorkQueue(location),
+}
+
+
+def register_backend(scheme, factory):
+    """Make `open_queue` accept `<scheme>://...` URLs; factory gets the part after '://'."""
+    BACKENDS[scheme] = factory
+
+
+def open_queue(url):
+    """Open a queue from a URL such as `sqlite:///path/to/queue.db` (a bare path means SQLite)."""
+    scheme, sep, location = url.partition("://")
+    if not sep:
+        return SQLiteWorkQueue(url)
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unsupported queue backend: {scheme}")
+    if scheme == "sqlite" and location.startswith("/"):
+        location = location[1:]  # sqlite:///rel.db -> rel.db, sqlite:////abs.db -> /abs.db
+    return BACKENDS[scheme](location)
@@ -0,0 +1,125 @@
+import io
+import os
+import sys
+import csv
+import threading
+import datetime
+
+
+class ApprovalStore:
+    """Write-behind store for approved websites.
+
+    The CSV schema is read once from the input file and all approvals of a
+    session go to a single output file. Rows are buffered in memory and a
+    background thread flushes them to disk (with fsync) every
+    `flush_interval` seconds or as soon as `max_buffer` rows are pending,
+    so request handlers never block on disk I/O.
+
+    If a flush fails the rows stay buffered and are retried, and `add` /
+    `add_many` raise until a flush succeeds again, so callers stop
+    acknowledging approvals that are not reaching disk.
+    """
+
+    def __init__(self, input_csv, output_dir, flush_interval=2.0, max_buffer=100):
+        # utf-8-sig like CsvPager, so a BOM does not end up in the first column name
+        with open(input_csv, 'r', encoding='utf-8-sig', newline='') as f:
+            self.fieldnames = csv.DictReader(f).fieldnames or []
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_file = os.path.join(
+            output_dir, 'website_classification_MANUAL_{}.csv'.format(timestamp)
+        )
+
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._file = None
+        self.last_error = None  # set while flushes are failing
+        self._unsynced = False  # rows written but not yet fsynced
+
+        self._flusher = threading.Thread(target=self._run, daemon=True)
+        self._flusher.start()
+
+    def add(self, website_data):
+        """Queue a single approved row. Returns immediately."""
+        return self.add_many([website_data])
+
+    def add_many(self, rows):
+        """Queue several approved rows at once. Returns the number queued."""
+        if self.last_error is not None:
+            raise RuntimeError(f"Approvals are not being saved: {self.last_error}")
+        # Keep only known columns so DictWriter never raises on stray keys
+        cleaned = [{k: row.get(k, '') for k in self.fieldnames} for row in rows]
+        with self._lock:
+            self._buffer.extend(cleaned)
+            pending = len(self._buffer)
+        if pending >= self.max_buffer:
+            self._wakeup.set()
+        return len(cleaned)
+
+    def flush(self):
+        """Write all buffered rows to disk and fsync the output file."""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows and not self._unsynced:
+            return 0
+        if rows:
+            start = None
+            try:
+                if self._file is None:
+                    self._file = open(self.output_file, 'ab', buffering=0)
+                start = os.fstat(self._file.fileno()).st_size
+                data = io.StringIO(newline='')
+                writer = csv.DictWriter(data, fieldnames=self.fieldnames)
+                if start == 0:
+                    writer.writeheader()
+                writer.writerows(rows)
+                remaining = memoryview(data.getvalue().encode('utf-8'))
+                while remaining:
+                    remaining = remaining[self._file.write(remaining):]
+            except Exception as e:
+                # Cut off whatever part of the rows got written, then put them all back for the next flush
+                if start is not None:
+                    try:
+                        os.ftruncate(self._file.fileno(), start)
+                    except OSError:
+                        pass
+                with self._lock:
+                    self._buffer[:0] = rows
+                self.last_error = e
+                raise
+        try:
+            # The rows are in the file now; a failed fsync is retried without writing them twice
+            self._unsynced = True
+            os.fsync(self._file.fileno())
+            self._unsynced = False
+        except Exception as e:
+            self.last_error = e
+            raise
+        self.last_error = None
+        return len(rows)
+
+    def close(self):
+        """Stop the background flusher and write out anything still pending."""
+        self._stopped.set()
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"ERROR: approvals could not be written to {self.output_file}: {e} "
+                      f"({len(self._buffer)} rows pending; new approvals are refused until this succeeds)",
+                      file=sys.stderr)
@@ -0,0 +1,298 @@
+"""
+Load benchmark for the manual review server.
+
+Starts manual_website_review.py in a subprocess against a generated CSV
+whose websites point at a local fixture site corpus, with the Selenium
+capture replaced by a stub that just fetches the fixture page. N simulated
+reviewers then scroll through pages, poll /get_preview_status once per
+poll interval (like index.html does) and approve websites. Reports
+response sizes, latency percentiles per endpoint and server RSS over time.
+
+Usage:
+  python3 benchmark_review_server.py --clients 10 --rows 5000 --duration 60
+  python3 benchmark_review_server.py --full-poll   # poll without url filter (all previews)
+"""
+import os
+import sys
+import csv
+import json
+import math
+import time
+import base64
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import signal
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 1x1 transparent PNG returned by the stub capture backend
+STUB_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+# ---------- Server side (runs in the subprocess) ---------- #
+
+def serve(csv_file, port, work_dir, capture_delay):
+    """Run the review app with the stubbed capture backend."""
+    sys.argv = [os.path.join(HERE, 'manual_website_review.py'), csv_file]
+    sys.path.insert(0, HERE)
+    import manual_website_review as review
+
+    def stub_capture_preview(url):
+        try:
+            urllib.request.urlopen(url, timeout=5).read()
+        except Exception as e:
+            print(f"Stub capture failed for {url}: {e}")
+            return False, url, None
+        time.sleep(capture_delay)
+        return True, url, STUB_PNG
+
+    review.capture_preview = stub_capture_preview
+    review.OUTPUT_DIR = os.path.join(work_dir, 'output')
+    review.load_stored_previews()
+    # main() stops this process with SIGTERM; flush buffered approvals like the real server does
+    signal.signal(signal.SIGTERM, review.close_approval_store)
+    review.app.run(port=port, threaded=True, debug=False, use_reloader=False)
+
+
+# ---------- Fixtures ---------- #
+
+def start_fixture_corpus(root, num_sites):
+    """Write a small static site corpus and serve it on a free local port."""
+    sites_dir = os.path.join(root, 'sites')
+    os.makedirs(sites_dir, exist_ok=True)
+    for i in range(num_sites):
+        paragraphs = "\n".join(f"<p>Section {j} of fixture site {i}.</p>" for j in range(random.randint(5, 50)))
+        with open(os.path.join(sites_dir, f"site_{i}.html"), 'w') as f:
+            f.write(f"<html><head><title>Fixture {i}</title></head><body><h1>Site {i}</h1>{paragraphs}</body></html>")
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=sites_dir, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_fixture_csv(path, num_rows, corpus_port, num_sites):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Website', 'Company', 'Email'])
+        for i in range(num_rows):
+            url = f"http://127.0.0.1:{corpus_port}/site_{i % num_sites}.html?row={i}"
+            writer.writerow([url, f"Company {i}", f"owner{i}@example.com"])
+
+
+# ---------- Client side ---------- #
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(latency_s, bytes)]
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def request(self, endpoint, url, data=None):
+        headers = {'Content-Type': 'application/json'} if data is not None else {}
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=body, headers=headers), timeout=30) as response:
+                payload = response.read()
+        except Exception:
+            with self._lock:
+                self.errors[endpoint] += 1
+            return None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.samples[endpoint].append((elapsed, len(payload)))
+        return payload
+
+
+def reviewer(client_id, base_url, recorder, stop, args):
+    """Simulate one reviewer: scroll pages, poll visible previews, approve some rows."""
+    rng = random.Random(client_id)
+    recorder.request('/', f"{base_url}/")
+    offset = rng.randrange(0, max(args.rows - args.page_size, 1))
+    visible = []
+    polls = 0
+    while not stop.is_set():
+        if not visible:
+            payload = recorder.request('/api/websites', f"{base_url}/api/websites?offset={offset}&limit={args.page_size}")
+            visible = json.loads(payload)['rows'] if payload else []
+            offset = (offset + args.page_size) % args.rows
+
+        if args.full_poll:
+            status_url = f"{base_url}/get_preview_status"
+        else:
+            query = urllib.parse.urlencode([('url', row['Website']) for row in visible[:args.visible_rows]])
+            status_url = f"{base_url}/get_preview_status?{query}"
+        recorder.request('/get_preview_status', status_url)
+        polls += 1
+
+        if visible and polls % args.approve_every == 0:
+            recorder.request('/approve_website', f"{base_url}/approve_website", data=visible[0])
+        if visible and polls % args.advance_every == 0:
+            visible = visible[1:]
+
+        stop.wait(args.poll_interval)
+
+
+def read_rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    try:
+        return int(subprocess.check_output(['ps', '-o', 'rss=', '-p', str(pid)]).strip() or 0)
+    except (subprocess.CalledProcessError, ValueError):
+        return 0
+
+
+def sample_rss(pid, samples, stop, interval=1.0):
+    start = time.time()
+    while not stop.is_set():
+        samples.append((time.time() - start, read_rss_kb(pid)))
+        stop.wait(interval)
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("Review server exited during startup")
+        try:
+            urllib.request.urlopen(f"{base_url}/api/websites?limit=1", timeout=2).read()
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise SystemExit("Review server did not come up in time")
+
+
+def report(recorder, rss_samples, args, elapsed):
+    results = {'config': vars(args), 'elapsed_s': elapsed, 'endpoints': {}, 'rss_kb': rss_samples}
+    print(f"\n{args.clients} clients, {args.rows} rows, {elapsed:.0f}s, "
+          f"{'full' if args.full_poll else 'filtered'} preview polling")
+    print(f"{'endpoint':<22}{'requests':>9}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'avg KB':>9}{'max KB':>9}")
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = [s[0] * 1000 for s in samples]
+        sizes = [s[1] / 1024 for s in samples]
+        stats = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(endpoint, 0),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'max_ms': max(latencies),
+            'avg_kb': sum(sizes) / len(sizes),
+            'max_kb': max(sizes),
+        }
+        results['endpoints'][endpoint] = stats
+        print(f"{endpoint:<22}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>9.1f}"
+              f"{stats['p95_ms']:>9.1f}{stats['max_ms']:>9.1f}{stats['avg_kb']:>9.1f}{stats['max_kb']:>9.1f}")
+
+    if rss_samples:
+        rss = [kb for _, kb in rss_samples]
+        print(f"\nServer RSS: start {rss[0] / 1024:.1f} MB, peak {max(rss) / 1024:.1f} MB, end {rss[-1] / 1024:.1f} MB")
+        step = max(1, len(rss_samples) // 10)
+        print("  " + "  ".join(f"{t:.0f}s:{kb / 1024:.0f}MB" for t, kb in rss_samples[::step]))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load benchmark for manual_website_review.py")
+    parser.add_argument("--clients", type=int, default=5, help="concurrent simulated reviewers")
+    parser.add_argument("--rows", type=int, default=5000, help="rows in the fixture CSV")
+    parser.add_argument("--sites", type=int, default=200, help="distinct pages in the fixture corpus")
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run the load")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between preview polls")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--visible-rows", type=int, default=3, help="rows each client polls previews for")
+    parser.add_argument("--approve-every", type=int, default=3, help="approve a row every N polls")
+    parser.add_argument("--advance-every", type=int, default=2, help="scroll past a row every N polls")
+    parser.add_argument("--capture-delay", type=float, default=0.2, help="simulated capture time in seconds")
+    parser.add_argument("--full-poll", action="store_true", help="poll all preview results, without url filter")
+    parser.add_argument("--port", type=int, default=5051)
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    # Internal: run the review server with the stub capture backend
+    parser.add_argument("--serve", nargs=2, metavar=("CSV", "WORK_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], args.port, args.serve[1], args.capture_delay)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='review_bench_') as work_dir:
+        benchmark(args, work_dir)
+
+
+def benchmark(args, work_dir):
+    """Run the server on a fixture corpus in work_dir and drive it with simulated reviewers."""
+    corpus = start_fixture_corpus(work_dir, args.sites)
+    csv_file = os.path.join(work_dir, 'websites.csv')
+    write_fixture_csv(csv_file, args.rows, corpus.server_address[1], args.sites)
+    print(f"Fixture corpus on port {corpus.server_address[1]}, CSV with {args.rows} rows in {work_dir}")
+
+    server_log = open(os.path.join(work_dir, 'server.log'), 'w')
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', csv_file, work_dir,
+         '--port', str(args.port), '--capture-delay', str(args.capture_delay)],
+        cwd=HERE, stdout=server_log, stderr=subprocess.STDOUT,
+        env=dict(os.environ, PREVIEW_STORE_DIR=os.path.join(work_dir, 'previews')),
+    )
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(base_url, process)
+
+        recorder = Recorder()
+        stop = threading.Event()
+        rss_samples = []
+        threads = [threading.Thread(target=sample_rss, args=(process.pid, rss_samples, stop), daemon=True)]
+        threads += [
+            threading.Thread(target=reviewer, args=(i, base_url, recorder, stop, args), daemon=True)
+            for i in range(args.clients)
+        ]
+        start = time.time()
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join(timeout=35)
+
+        report(recorder, rss_samples, args, time.time() - start)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        corpus.shutdown()
+        server_log.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+import io
+import os
+import csv
+import threading
+from array import array
+from itertools import islice
+
+
+class CsvPager:
+    """Random access to pages of a CSV file without loading every row.
+
+    The file is scanned once to record the byte offset at which each record
+    starts (quoted fields spanning several lines are handled). A page is then
+    read by seeking straight to its first record and parsing only `limit`
+    rows. The index is rebuilt automatically if the file changes on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fieldnames = []
+        self._offsets = array('q')
+        self._signature = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        self._refresh()
+        return len(self._offsets)
+
+    def page(self, offset=0, limit=50):
+        """Return up to `limit` rows (as dicts) starting at row `offset`."""
+        self._refresh()
+        if offset < 0 or offset >= len(self._offsets) or limit <= 0:
+            return []
+        with open(self.path, 'rb') as raw:
+            raw.seek(self._offsets[offset])
+            text = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            reader = csv.DictReader(text, fieldnames=self.fieldnames)
+            return list(islice(reader, limit))
+
+    def _refresh(self):
+        stat = os.stat(self.path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._build_index()
+                self._signature = signature
+
+    def _build_index(self):
+        offsets = array('q')
+        header_end = None
+        position = 0
+        record_start = 0
+        in_quotes = False
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not in_quotes:
+                    record_start = position
+                # An odd number of quotes toggles whether we are inside a quoted field
+                if line.count(b'"') % 2:
+                    in_quotes = not in_quotes
+                position += len(line)
+                if in_quotes:
+                    continue
+                if header_end is None:
+                    header_end = position
+                elif line.strip():
+                    offsets.append(record_start)
+
+            fieldnames = []
+            if header_end:
+                f.seek(0)
+                header = f.read(header_end).decode('utf-8-sig')
+                fieldnames = next(csv.reader(io.StringIO(header, newline='')), [])
+
+        self.fieldnames = fieldnames
+        self._offsets = offsets
+
+
+def _self_check():
+    """Page a BOM-prefixed CSV with multi-line fields and approve rows read from it."""
+    import tempfile
+    from approval_store import ApprovalStore
+
+    failures = []
+
+    def check(name, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_csv = os.path.join(tmp, 'websites.csv')
+        with open(input_csv, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Website', 'Company', 'Notes'])
+            for i in range(120):
+                writer.writerow([f'https://site{i}.com', f'Company {i}', f'line one\nline two of {i}' if i % 7 == 0 else ''])
+
+        pager = CsvPager(input_csv)
+        rows = pager.page(100, 50)
+        check("120 rows indexed", len(pager) == 120)
+        check("BOM stripped from the header", pager.fieldnames == ['Website', 'Company', 'Notes'])
+        check("page starts at the requested row and stops at the end",
+              len(rows) == 20 and rows[0]['Website'] == 'https://site100.com')
+        check("multi-line fields survive", pager.page(7, 1)[0]['Notes'] == 'line one\nline two of 7')
+
+        store = ApprovalStore(input_csv, os.path.join(tmp, 'output'))
+        store.add_many(rows[:3])
+        store.close()
+        with open(store.output_file, 'r', encoding='utf-8', newline='') as f:
+            approved = list(csv.DictReader(f))
+        check("approval store uses the same column names as the pager", store.fieldnames == pager.fieldnames)
+        check("approved rows keep their Website", [r.get('Website') for r in approved] ==
+              ['https://site100.com', 'https://site101.com', 'https://site102.com'])
+    return not failures
+
+
+if __name__ == '__main__':
+    raise SystemExit(0 if _self_check() else 1)
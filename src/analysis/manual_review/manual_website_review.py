@@ -2,7 +2,7 @@ import os
 import csv
 import sys
 import datetime
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -16,9 +16,16 @@ from io import BytesIO
 from PIL import Image
 import threading
 from queue import Queue
-import requests
+import atexit
+import signal
 from urllib.parse import urlparse
 from dotenv import load_dotenv
+from approval_store import ApprovalStore
+from csv_pager import CsvPager
+from preview_store import PreviewStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+import http_client
 
 # Load environment variables from config directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '../config/.env'))
@@ -26,10 +33,21 @@ load_dotenv(os.path.join(os.path.dirname(__file__), '../config/.env'))
 app = Flask(__name__)
 
 # Global variables
-output_filename = None
-csv_filename = None
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), '../../data/output')
+csv_filename = sys.argv[1] if len(sys.argv) == 2 else None
+approval_store = None
+approval_store_lock = threading.Lock()
+csv_pager = None
 preview_queue = Queue()
 preview_results = {}
+queued_urls = set()
+preview_threads = []
+preview_lock = threading.Lock()
+preview_store = PreviewStore()
+
+NUM_PREVIEW_THREADS = 5
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
 # List of proxy services (you can add more)
 PROXY_SERVICES = [
@@ -44,7 +62,8 @@ def get_proxy_url(url):
         try:
             # Test the proxy
             test_url = f"{proxy}{url}"
-            response = requests.get(test_url, timeout=5)
+            # Falls through to the next proxy instead of retrying this one
+            response = http_client.get(test_url, timeout=5, retry="none")
             if response.status_code == 200:
                 return test_url
         except:
@@ -77,7 +96,13 @@ def capture_full_page(driver):
     
     return screenshot
 
-def check_website_preview(url):
+def capture_preview(url):
+    """Capture a preview of url.
+
+    Returns (can_load_in_iframe, proxy_url, screenshot) where screenshot is
+    PNG bytes or None.
+    """
+    driver = None
     try:
         driver = setup_driver()
         
@@ -89,14 +114,9 @@ def check_website_preview(url):
             )
             # Take screenshot anyway in case iframe fails
             screenshot = capture_full_page(driver)
-            screenshot_b64 = base64.b64encode(screenshot).decode('utf-8')
             
             # More permissive iframe check - if we can load the page, we'll try iframe
-            preview_results[url] = {
-                'can_load_in_iframe': True,
-                'screenshot': screenshot_b64,  # Keep screenshot as backup
-                'proxy_url': url
-            }
+            return True, url, screenshot
             
         except Exception as direct_error:
             print(f"Direct load failed for {url}: {direct_error}")
@@ -109,33 +129,51 @@ def check_website_preview(url):
                         EC.presence_of_element_located((By.TAG_NAME, "body"))
                     )
                     screenshot = capture_full_page(driver)
-                    preview_results[url] = {
-                        'can_load_in_iframe': True,
-                        'screenshot': base64.b64encode(screenshot).decode('utf-8'),
-                        'proxy_url': proxy_url
-                    }
+                    return True, proxy_url, screenshot
                 else:
                     raise Exception("No working proxy found")
             except Exception as proxy_error:
                 print(f"Proxy load failed for {url}: {proxy_error}")
-                preview_results[url] = {
-                    'can_load_in_iframe': False,
-                    'screenshot': None,
-                    'proxy_url': url
-                }
-        
-        if driver:
-            driver.quit()
+                return False, url, None
             
     except Exception as e:
         print(f"Complete failure for {url}: {e}")
+        return False, url, None
+    finally:
         if driver:
             driver.quit()
-        preview_results[url] = {
-            'can_load_in_iframe': False,
-            'screenshot': None,
-            'proxy_url': url
-        }
+
+def preview_view(entry):
+    """What the browser gets for a stored preview (screenshots are served by URL)."""
+    screenshot_file = entry.get('screenshot_file')
+    return {
+        'can_load_in_iframe': entry['can_load_in_iframe'],
+        'screenshot_url': f"/preview_screenshot/{screenshot_file}" if screenshot_file else None,
+        'proxy_url': entry['proxy_url'],
+        'captured_at': entry['captured_at'],
+    }
+
+def check_website_preview(url):
+    can_load_in_iframe, proxy_url, screenshot = capture_preview(url)
+    entry = preview_store.save(url, can_load_in_iframe, proxy_url, screenshot)
+    preview_results[url] = preview_view(entry)
+
+def load_stored_previews():
+    """Serve fresh previews from the store right away; stale ones get re-captured."""
+    adopt_stored_previews(preview_store.entries())
+    print(f"Loaded {len(preview_results)} stored previews from {preview_store.root}")
+
+def refresh_stored_previews():
+    """Pick up previews stored since startup, e.g. by `prewarm_previews.py --background`."""
+    adopt_stored_previews(preview_store.refresh())
+
+def adopt_stored_previews(entries):
+    with preview_lock:
+        for entry in entries:
+            current = preview_results.get(entry['url'])
+            if preview_store.is_fresh(entry) and (current is None or entry['captured_at'] > current['captured_at']):
+                preview_results[entry['url']] = preview_view(entry)
+                queued_urls.add(entry['url'])
 
 def preview_worker():
     while True:
@@ -145,80 +183,102 @@ def preview_worker():
         check_website_preview(url)
         preview_queue.task_done()
 
-def get_websites_from_csv(csv_file):
-    websites = []
-    try:
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                websites.append(row)
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        sys.exit(1)
-    return websites
+def start_preview_workers():
+    """Start the preview worker threads once per process."""
+    with preview_lock:
+        if preview_threads:
+            return
+        for _ in range(NUM_PREVIEW_THREADS):
+            t = threading.Thread(target=preview_worker, daemon=True)
+            t.start()
+            preview_threads.append(t)
 
-def save_approved_website(website_data):
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(os.path.dirname(__file__), '../../data/output/website_classification_MANUAL_{}.csv'.format(timestamp))
-    
-    # Create output filename only once
-    if output_filename is None:
-        output_filename = output_file
-    
+def queue_previews(urls):
+    """Queue preview captures for URLs that have not been requested yet."""
+    start_preview_workers()
+    if any(url and url not in queued_urls for url in urls):
+        refresh_stored_previews()
+    with preview_lock:
+        new_urls = [url for url in urls if url and url not in queued_urls]
+        queued_urls.update(new_urls)
+    for url in new_urls:
+        preview_queue.put(url)
+
+def get_csv_pager():
+    global csv_pager
+    if csv_pager is None:
+        csv_pager = CsvPager(csv_filename)
+    return csv_pager
+
+def get_approval_store():
+    """Create the approval store on first use (schema is read once per session)."""
+    global approval_store
+    with approval_store_lock:
+        if approval_store is None:
+            approval_store = ApprovalStore(csv_filename, OUTPUT_DIR)
+            atexit.register(close_approval_store)
+            print(f"Saving approvals to {approval_store.output_file}")
+        return approval_store
+
+def close_approval_store(signum=None, frame=None):
+    """Flush buffered approvals; also the SIGTERM handler, since SIGTERM skips atexit."""
+    with approval_store_lock:
+        store = approval_store
+    if store is not None:
+        store.close()
+    if signum is not None:
+        raise SystemExit(128 + signum)
+
+def save_approved_websites(rows):
     try:
-        file_exists = os.path.exists(output_file)
-        
-        # Get fieldnames from the first row of the input CSV
-        with open(csv_filename, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            fieldnames = reader.fieldnames
-        
-        with open(output_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(website_data)
+        get_approval_store().add_many(rows)
         return True
     except Exception as e:
         print(f"Error saving to CSV: {e}")
         return False
 
+def save_approved_website(website_data):
+    return save_approved_websites([website_data])
+
 @app.route('/')
 def index():
-    if len(sys.argv) != 2:
+    if csv_filename is None:
         return "Usage: python3 manual_website_review.py <csv_file>"
-    
-    csv_file = sys.argv[1]
-    websites = get_websites_from_csv(csv_file)  # Get all websites
-    
-    # Start preview worker threads
-    num_threads = 5
-    threads = []
-    for _ in range(num_threads):
-        t = threading.Thread(target=preview_worker)
-        t.start()
-        threads.append(t)
-    
-    # Queue websites for preview
-    for website in websites:
-        preview_queue.put(website['Website'])
-    
-    # Add sentinel values to stop workers
-    for _ in range(num_threads):
-        preview_queue.put(None)
-    
-    # Start a background thread to wait for previews
-    def wait_for_previews():
-        preview_queue.join()
-        print("All previews completed")
-    
-    threading.Thread(target=wait_for_previews).start()
-    
-    return render_template('index.html', websites=websites)
+
+    total = len(get_csv_pager())
+    return render_template('index.html', total=total, page_size=DEFAULT_PAGE_SIZE)
+
+@app.route('/api/websites')
+def list_websites():
+    if csv_filename is None:
+        return jsonify({'error': 'No CSV file given'}), 400
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    pager = get_csv_pager()
+    rows = pager.page(offset, limit)
+
+    # Only capture previews for rows a reviewer is actually about to see
+    queue_previews([row.get('Website') for row in rows])
+
+    return jsonify({
+        'total': len(pager),
+        'offset': offset,
+        'rows': rows,
+    })
 
 @app.route('/get_preview_status')
 def get_preview_status():
-    return jsonify(preview_results)
+    urls = request.args.getlist('url')
+    if not urls or any(url not in preview_results for url in urls):
+        refresh_stored_previews()
+    if not urls:
+        return jsonify(preview_results)
+    return jsonify({url: preview_results[url] for url in urls if url in preview_results})
+
+@app.route('/preview_screenshot/<path:filename>')
+def preview_screenshot(filename):
+    return send_from_directory(preview_store.screenshot_dir, filename, max_age=86400)
 
 @app.route('/approve_website', methods=['POST'])
 def approve_website():
@@ -226,5 +286,16 @@ def approve_website():
     success = save_approved_website(website_data)
     return jsonify({'success': success})
 
+@app.route('/approve_websites', methods=['POST'])
+def approve_websites():
+    payload = request.json
+    rows = payload.get('websites', []) if isinstance(payload, dict) else payload
+    if not isinstance(rows, list):
+        return jsonify({'success': False, 'error': 'Expected a list of websites'}), 400
+    success = save_approved_websites(rows)
+    return jsonify({'success': success, 'count': len(rows) if success else 0})
+
 if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, close_approval_store)
+    load_stored_previews()
     app.run(debug=True, port=5001) 
\ No newline at end of file
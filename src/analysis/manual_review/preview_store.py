@@ -0,0 +1,121 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_STORE_DIR = os.getenv('PREVIEW_STORE_DIR', os.path.join(os.path.dirname(__file__), '../../data/previews'))
+DEFAULT_MAX_AGE_HOURS = float(os.getenv('PREVIEW_MAX_AGE_HOURS', 24 * 7))
+
+
+class PreviewStore:
+    """Persistent, on-disk store of website previews.
+
+    Screenshots are written as PNG files named after the URL hash and the
+    capture time. Metadata goes to an append-only `index.jsonl`; when a URL
+    has been captured more than once the newest entry wins. Entries older
+    than `max_age` are considered stale and get re-captured. Several
+    processes may share a store; `refresh` picks up what the others wrote.
+    """
+
+    def __init__(self, root=DEFAULT_STORE_DIR, max_age_hours=DEFAULT_MAX_AGE_HOURS):
+        self.root = os.path.abspath(root)
+        self.screenshot_dir = os.path.join(self.root, 'screenshots')
+        self.index_file = os.path.join(self.root, 'index.jsonl')
+        self.max_age = timedelta(hours=max_age_hours)
+        self._entries = {}
+        self._index_pos = 0       # bytes of index.jsonl read so far
+        self._index_stat = None   # (inode, size, mtime) at the last read
+        self._lock = threading.Lock()
+        os.makedirs(self.screenshot_dir, exist_ok=True)
+        self.load()
+
+    def load(self):
+        """(Re)load the index from disk. Returns the number of URLs known."""
+        with self._lock:
+            self._entries = {}
+            self._index_pos = 0
+            self._index_stat = None
+        self.refresh()
+        return len(self._entries)
+
+    def refresh(self):
+        """Read entries appended to the index since the last read, e.g. by prewarm_previews.py.
+
+        Cheap when nothing changed (one stat call). Returns the entries that
+        became the newest for their URL.
+        """
+        try:
+            st = os.stat(self.index_file)
+        except FileNotFoundError:
+            return []
+        stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            if stat == self._index_stat:
+                return []
+            if self._index_stat and (st.st_ino != self._index_stat[0] or st.st_size < self._index_pos):
+                # The index was replaced or truncated: start over
+                self._entries = {}
+                self._index_pos = 0
+            with open(self.index_file, 'rb') as f:
+                f.seek(self._index_pos)
+                data = f.read()
+            # Leave a partially written last line for the next refresh
+            complete = data.rfind(b'\n') + 1
+            added = []
+            for line in data[:complete].splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # skip a line mangled by a crashed writer
+                previous = self._entries.get(entry.get('url'))
+                if previous is None or entry['captured_at'] >= previous['captured_at']:
+                    self._entries[entry['url']] = entry
+                    added.append(entry)
+            self._index_pos += complete
+            self._index_stat = stat
+        return added
+
+    def get(self, url):
+        return self._entries.get(url)
+
+    def entries(self):
+        return list(self._entries.values())
+
+    def is_fresh(self, entry):
+        if not entry:
+            return False
+        captured_at = datetime.fromisoformat(entry['captured_at'])
+        return datetime.now(timezone.utc) - captured_at < self.max_age
+
+    def missing_or_stale(self, urls):
+        """Return the URLs that have no capture or only a stale one."""
+        return [url for url in urls if not self.is_fresh(self.get(url))]
+
+    def save(self, url, can_load_in_iframe, proxy_url, screenshot=None):
+        """Persist a capture (screenshot as PNG bytes) and return its entry."""
+        captured_at = datetime.now(timezone.utc)
+        screenshot_file = None
+        if screenshot:
+            url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()
+            screenshot_file = f"{url_hash}_{captured_at.strftime('%Y%m%d%H%M%S%f')}.png"
+            with open(os.path.join(self.screenshot_dir, screenshot_file), 'wb') as f:
+                f.write(screenshot)
+
+        entry = {
+            'url': url,
+            'captured_at': captured_at.isoformat(),
+            'can_load_in_iframe': can_load_in_iframe,
+            'proxy_url': proxy_url,
+            'screenshot_file': screenshot_file,
+        }
+        with self._lock:
+            with open(self.index_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+            self._entries[url] = entry
+        return entry
+
+    def screenshot_path(self, entry):
+        if not entry or not entry.get('screenshot_file'):
+            return None
+        return os.path.join(self.screenshot_dir, entry['screenshot_file'])
@@ -0,0 +1,98 @@
+"""
+Pre-capture website previews for a review CSV ahead of time.
+
+Captures are written to the persistent preview store that
+manual_website_review.py loads on startup, so the review server can render
+straight away and only captures what is missing or stale.
+
+Usage:
+  python3 prewarm_previews.py <csv_file> [--workers 5] [--max-age-hours 168]
+  python3 prewarm_previews.py <csv_file> --background   # detach and log to a file
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from csv_pager import CsvPager
+from preview_store import PreviewStore, DEFAULT_STORE_DIR, DEFAULT_MAX_AGE_HOURS
+
+
+def iter_urls(csv_file, page_size=500):
+    """Stream the Website column of the CSV without loading it all at once."""
+    pager = CsvPager(csv_file)
+    for offset in range(0, len(pager), page_size):
+        for row in pager.page(offset, page_size):
+            if row.get('Website'):
+                yield row['Website']
+
+
+def prewarm(csv_file, store, workers=5):
+    # Imported here so --background can detach before Selenium/Flask load
+    from manual_website_review import capture_preview
+
+    urls = list(dict.fromkeys(iter_urls(csv_file)))
+    todo = store.missing_or_stale(urls)
+    print(f"{len(urls)} websites in {csv_file}, {len(urls) - len(todo)} already fresh, capturing {len(todo)}")
+
+    def capture_and_store(url):
+        can_load_in_iframe, proxy_url, screenshot = capture_preview(url)
+        store.save(url, can_load_in_iframe, proxy_url, screenshot)
+        return url, screenshot is not None
+
+    start_time = time.time()
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(capture_and_store, url) for url in todo]
+        for future in as_completed(futures):
+            url, captured = future.result()
+            done += 1
+            if not captured:
+                failed += 1
+            print(f"[{done}/{len(todo)}] {'ok' if captured else 'no screenshot'}: {url}")
+
+    print(f"Captured {done - failed}/{len(todo)} previews in {time.time() - start_time:.1f} seconds")
+
+
+def detach(argv, log_file):
+    """Re-run this script in a new session with output going to log_file."""
+    args = [sys.executable, os.path.abspath(__file__)] + argv
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+    with open(log_file, 'a') as log:
+        process = subprocess.Popen(
+            args, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+            start_new_session=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    print(f"Pre-warming in the background (pid {process.pid}), logging to {log_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-capture website previews for a review CSV")
+    parser.add_argument("csv_file")
+    parser.add_argument("--workers", type=int, default=5, help="concurrent browser captures")
+    parser.add_argument("--max-age-hours", type=float, default=DEFAULT_MAX_AGE_HOURS,
+                        help="re-capture previews older than this")
+    parser.add_argument("--store", default=DEFAULT_STORE_DIR, help="preview store directory")
+    parser.add_argument("--background", action="store_true", help="detach and keep running in the background")
+    args = parser.parse_args()
+
+    csv_file = os.path.abspath(args.csv_file)
+    if not os.path.exists(csv_file):
+        print(f"Error reading CSV file: {csv_file} not found")
+        sys.exit(1)
+
+    store_dir = os.path.abspath(args.store)
+    if args.background:
+        argv = [csv_file, '--workers', str(args.workers),
+                '--max-age-hours', str(args.max_age_hours), '--store', store_dir]
+        detach(argv, os.path.join(store_dir, 'prewarm.log'))
+        return
+
+    store = PreviewStore(store_dir, max_age_hours=args.max_age_hours)
+    prewarm(csv_file, store, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
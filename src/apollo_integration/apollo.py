@@ -1,4 +1,5 @@
 import os
+import sys
 import requests
 import time
 import json
@@ -6,6 +7,10 @@ from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import http_client
+from apollo_cache import ApolloCache
+
 load_dotenv()
 APOLLO_API_KEY = os.getenv("APOLLO_API_KEY")
 if not APOLLO_API_KEY:
@@ -28,6 +33,10 @@ LAST_RUN_FILE = os.path.join(os.path.dirname(__file__), "last_run_timestamp.json
 PAGE_FILE = os.path.join(os.path.dirname(__file__), "current_page.json")
 SEEN_DOMAINS_FILE = os.path.join(os.path.dirname(__file__), "seen_domains.json")
 
+# Raw search and enrichment responses are kept for replay unless APOLLO_CACHE=0
+CACHE_RESPONSES = os.getenv("APOLLO_CACHE", "1") != "0"
+apollo_cache = ApolloCache()
+
 # Disable ALL logging
 logging.basicConfig(level=logging.CRITICAL)
 logger = logging.getLogger(__name__)
@@ -78,8 +87,12 @@ def get_last_run():
     except (FileNotFoundError, json.JSONDecodeError):
         return (datetime.utcnow() - timedelta(days=1)).isoformat()
 
-def get_organization_data(domain):
+def get_organization_data(domain, replay=False):
     """Get organization data including industry using the enrichment endpoint."""
+    if replay:
+        data = apollo_cache.get_enrichment(domain) or {}
+        return data.get("organization", {}).get("industry", "")
+
     url = f"{APOLLO_BASE_URL}/organizations/enrich"
     headers = {
         "accept": "application/json",
@@ -89,9 +102,11 @@ def get_organization_data(domain):
     params = {"domain": domain}
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = http_client.get(url, headers=headers, params=params)
         if response.status_code == 200:
             data = response.json()
+            if CACHE_RESPONSES:
+                apollo_cache.put_enrichment(domain, data)
             org = data.get("organization", {})
             return org.get("industry", "")
         return ""
@@ -106,8 +121,12 @@ def extract_domain(url):
     domain = domain.split("/")[0]
     return domain
 
-def fetch_contacts_page(page, per_page, last_run):
-    """Fetch a single page of contacts from Apollo."""
+def fetch_contacts_page(page, per_page, last_run, replay=False):
+    """Fetch a single page of contacts from Apollo (or, with replay, from the local cache)."""
+    if replay:
+        data = apollo_cache.get_page(CURRENT_LIST_ID, last_run, page, per_page) or {}
+        return data.get("contacts", []), data.get("pagination", {}).get("total_entries", 0)
+
     headers = {
         "accept": "application/json",
         "Cache-Control": "no-cache",
@@ -127,82 +146,105 @@ def fetch_contacts_page(page, per_page, last_run):
     }
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        # contacts/search only reads, so it is safe to retry like a GET
+        response = http_client.post(url, headers=headers, json=payload, retry="read_only")
         response.raise_for_status()
-    data = response.json()
-    contacts = data.get("contacts", [])
+        data = response.json()
+        if CACHE_RESPONSES:
+            apollo_cache.put_page(CURRENT_LIST_ID, last_run, page, per_page, data)
+        contacts = data.get("contacts", [])
         return contacts, data.get("pagination", {}).get("total_entries", 0)
     except requests.RequestException:
         return [], 0
 
-def get_contacts_from_apollo(num_contacts=15, reset_seen=False):
+def get_contacts_from_apollo(num_contacts=15, reset_seen=False, replay=False, window=None):
     """
     Retrieves a list of contacts using pagination and deduplication.
     
     :param num_contacts: Number of unique contacts to retrieve
     :param reset_seen: Whether to reset the seen domains set
+    :param replay: Run the same pipeline over cached responses: no network, no state saved,
+                   and dedupe starts from an empty set of seen domains
+    :param window: With replay, the cached query window to use (default: the latest one)
     :return: List of unique contacts
     """
-    seen_domains = set() if reset_seen else load_seen_domains()
+    per_page = min(num_contacts * 2, 100)
+    if replay:
+        windows = apollo_cache.windows(CURRENT_LIST_ID)
+        last_run = window or apollo_cache.latest_window(CURRENT_LIST_ID)
+        if last_run not in windows:
+            print(f"No cached pages for list {CURRENT_LIST_ID} window {last_run}")
+            return []
+        # Pages only line up with the page size they were fetched with
+        per_page = windows[last_run]["per_page"]
+        page = windows[last_run]["pages"][0]
+        seen_domains = set()
+    else:
+        seen_domains = set() if reset_seen else load_seen_domains()
+        page = get_current_page()
+        last_run = get_last_run()
     results = []
-    page = get_current_page()
-    last_run = get_last_run()
     last_contact_time = None
     
-    print(f"Fetching contacts updated since: {last_run}")
+    print(f"{'Replaying cached' if replay else 'Fetching'} contacts updated since: {last_run}")
     print(f"Starting from page: {page}")
     
     while len(results) < num_contacts:
-        contacts, total = fetch_contacts_page(page, min(num_contacts * 2, 100), last_run)
+        contacts, total = fetch_contacts_page(page, per_page, last_run, replay=replay)
         
         if not contacts:
             break
     
-    for contact in contacts:
-        website = contact.get("website_url")
+        for contact in contacts:
+            website = contact.get("website_url")
             organization = contact.get("organization", {})
         
-        if not website and organization:
-            website = organization.get("website_url")
+            if not website and organization:
+                website = organization.get("website_url")
         
-        if website:
-            domain = extract_domain(website)
-            if domain in seen_domains:
-                continue
+            if website:
+                domain = extract_domain(website)
+                if domain in seen_domains:
+                    continue
             
-            seen_domains.add(domain)
-            industry = get_organization_data(domain)
+                seen_domains.add(domain)
+                industry = get_organization_data(domain, replay=replay)
             
-            if not industry:
-                industry = organization.get("industry", "")
+                if not industry:
+                    industry = organization.get("industry", "")
             
-            results.append({
-                "website": website,
-                "company_name": organization.get("name", ""),
-                "first_name": contact.get("first_name", ""),
-                "last_name": contact.get("last_name", ""),
-                "email": contact.get("email", ""),
-                "location": ", ".join(filter(None, [
-                    contact.get("city", ""),
-                    contact.get("state", ""),
-                    contact.get("country", "")
-                ])),
-                "industry": industry
-            })
+                results.append({
+                    "website": website,
+                    "company_name": organization.get("name", ""),
+                    "first_name": contact.get("first_name", ""),
+                    "last_name": contact.get("last_name", ""),
+                    "email": contact.get("email", ""),
+                    "location": ", ".join(filter(None, [
+                        contact.get("city", ""),
+                        contact.get("state", ""),
+                        contact.get("country", "")
+                    ])),
+                    "industry": industry
+                })
             
-            last_contact_time = contact.get("updated_at")
+                last_contact_time = contact.get("updated_at")
             
-            if len(results) >= num_contacts:
-                break
+                if len(results) >= num_contacts:
+                    break
             
-        time.sleep(0.5)
-        
         page += 1
+        if replay:
+            continue
+        time.sleep(0.5)
         save_current_page(page)
         
-        if len(contacts) < min(num_contacts * 2, 100):  # No more results available
+        if len(contacts) < per_page:  # No more results available
             break
     
+    if replay:
+        print(f"Replayed {len(results)} unique contacts")
+        return results[:num_contacts]
+    
     # Update the last run time to just after the last contact we processed
     if last_contact_time:
         save_last_run(last_contact_time)
@@ -214,7 +256,14 @@ def get_contacts_from_apollo(num_contacts=15, reset_seen=False):
     return results[:num_contacts]
 
 if __name__ == "__main__":
-    contacts = get_contacts_from_apollo()
+    import argparse
+    parser = argparse.ArgumentParser(description="Fetch deduplicated contacts from the current Apollo list")
+    parser.add_argument("num_contacts", nargs="?", type=int, default=15)
+    parser.add_argument("--replay", action="store_true", help="run from cached responses without the network")
+    parser.add_argument("--window", help="cached query window to replay (default: the latest)")
+    args = parser.parse_args()
+
+    contacts = get_contacts_from_apollo(num_contacts=args.num_contacts, replay=args.replay, window=args.window)
     print(f"Fetched {len(contacts)} contacts from Apollo:")
     for contact in contacts:
         print(contact)
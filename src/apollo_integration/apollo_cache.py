@@ -0,0 +1,168 @@
+"""
+Append-only compressed cache of raw Apollo responses.
+
+Every contacts/search page is appended to <cache_dir>/<list_id>.jsonl.gz,
+keyed by query window (the `q_prospect_updated_at.gte` timestamp), page and
+page size. Organization enrichment responses go to enrichment.jsonl.gz,
+keyed by domain. Each record is written as its own gzip member; a member
+torn by a crash mid-write is cut off before the next append, so only
+that record is lost.
+
+The cache lets get_contacts_from_apollo(replay=True) re-run the dedupe
+and enrichment pipeline with no network, e.g. after changing filtering.
+
+Usage:
+  python3 apollo_cache.py [--list-id ID]   # show cached windows and pages
+"""
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+
+DEFAULT_CACHE_DIR = os.getenv("APOLLO_CACHE_DIR", os.path.join(os.path.dirname(__file__), "apollo_cache"))
+ENRICHMENT_FILE = "enrichment.jsonl.gz"
+
+
+def _read_records(path):
+    """Yield records from a gzip JSONL file, stopping quietly at a truncated tail."""
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except (EOFError, zlib.error, gzip.BadGzipFile, json.JSONDecodeError):
+            # Last member was cut short by a crash mid-write, or its header is corrupt
+            return
+
+
+def _truncate_torn_tail(path):
+    """Cut a trailing gzip member left incomplete by a crash, so appends after it stay readable."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    good = offset = 0
+    while offset < len(data):
+        member = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            member.decompress(data[offset:])
+        except zlib.error:
+            break
+        if not member.eof:
+            break
+        offset = len(data) - len(member.unused_data)
+        good = offset
+    if good < len(data):
+        with open(path, "r+b") as f:
+            f.truncate(good)
+
+
+class ApolloCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._pages = {}       # list_id -> {(window, per_page, page): record}
+        self._enrichment = None
+        self._checked = set()  # files checked for a torn tail by this process
+
+    def _list_path(self, list_id):
+        return os.path.join(self.cache_dir, f"{list_id}.jsonl.gz")
+
+    def _append(self, path, record):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if path not in self._checked:
+            _truncate_torn_tail(path)
+            self._checked.add(path)
+        with gzip.open(path, "ab") as f:
+            f.write((json.dumps(record) + "\n").encode("utf-8"))
+
+    def _load_pages(self, list_id):
+        if list_id not in self._pages:
+            pages = {}
+            for record in _read_records(self._list_path(list_id)):
+                # Later fetches of the same page replace earlier ones
+                pages[(record["window"], record["per_page"], record["page"])] = record
+            self._pages[list_id] = pages
+        return self._pages[list_id]
+
+    def put_page(self, list_id, window, page, per_page, response):
+        record = {
+            "list_id": list_id,
+            "window": window,
+            "page": page,
+            "per_page": per_page,
+            "fetched_at": datetime.utcnow().isoformat(),
+            "response": response,
+        }
+        self._append(self._list_path(list_id), record)
+        if list_id in self._pages:
+            self._pages[list_id][(window, per_page, page)] = record
+
+    def get_page(self, list_id, window, page, per_page):
+        """Cached contacts/search response, or None."""
+        record = self._load_pages(list_id).get((window, per_page, page))
+        return record["response"] if record else None
+
+    def windows(self, list_id):
+        """{window: {"per_page", "pages", "fetched_at"}} for every cached query window of a list.
+
+        Where one window was fetched with several page sizes, the most recent one wins.
+        """
+        pages = self._load_pages(list_id)
+        latest = {}
+        for (window, per_page, page), record in pages.items():
+            if window not in latest or record["fetched_at"] > latest[window]["fetched_at"]:
+                latest[window] = {"per_page": per_page, "fetched_at": record["fetched_at"]}
+        return {
+            window: dict(info, pages=sorted(p for (w, pp, p) in pages if w == window and pp == info["per_page"]))
+            for window, info in latest.items()
+        }
+
+    def latest_window(self, list_id):
+        windows = self.windows(list_id)
+        if not windows:
+            return None
+        return max(windows, key=lambda w: windows[w]["fetched_at"])
+
+    def put_enrichment(self, domain, response):
+        record = {"domain": domain, "fetched_at": datetime.utcnow().isoformat(), "response": response}
+        self._append(os.path.join(self.cache_dir, ENRICHMENT_FILE), record)
+        if self._enrichment is not None:
+            self._enrichment[domain] = response
+
+    def get_enrichment(self, domain):
+        if self._enrichment is None:
+            self._enrichment = {
+                record["domain"]: record["response"]
+                for record in _read_records(os.path.join(self.cache_dir, ENRICHMENT_FILE))
+            }
+        return self._enrichment.get(domain)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Show cached Apollo search pages")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--list-id", help="list to show (default: every cached list)")
+    args = parser.parse_args()
+
+    cache = ApolloCache(args.cache_dir)
+    if args.list_id:
+        list_ids = [args.list_id]
+    elif os.path.isdir(args.cache_dir):
+        list_ids = sorted(name[:-len(".jsonl.gz")] for name in os.listdir(args.cache_dir)
+                          if name.endswith(".jsonl.gz") and name != ENRICHMENT_FILE)
+    else:
+        list_ids = []
+    for list_id in list_ids:
+        print(list_id)
+        for window, entry in sorted(cache.windows(list_id).items()):
+            pages = entry["pages"]
+            print(f"  window {window}: {len(pages)} pages ({pages[0]}-{pages[-1]}) of {entry['per_page']}, "
+                  f"last fetched {entry['fetched_at']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,14 @@
 import os
+import sys
 import time
 import csv
 import requests
 from datetime import datetime
 import schedule
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import http_client
+
 def upload_contacts_to_sequence():
     # Apollo API configuration
     APOLLO_API_KEY = os.getenv("APOLLO_API_KEY")
@@ -57,7 +61,8 @@ def upload_contacts_to_sequence():
                 print(f"Payload: {payload}")
                 print("---")
             else:
-                response = requests.post(url, headers=headers, json=payload)
+                # Only retried when the request never reached Apollo, so a contact is never added twice
+                response = http_client.post(url, headers=headers, json=payload, retry="connect")
                 response.raise_for_status()
             print(f"Added {contact['email']} to sequence")
             time.sleep(1)  # Rate limiting
@@ -0,0 +1,187 @@
+"""
+Shared HTTP client for every outbound call in the project.
+
+One requests.Session per (scheme, host, retry policy) keeps TCP/TLS
+connections alive between calls to the same API, every request gets a
+connect/read timeout unless the caller passes its own, and retries are
+handled by urllib3 according to a named policy:
+
+  none        never retry
+  connect     retry only failures where the request never reached the
+              server (connection errors, 429); safe for writes
+  idempotent  also retry read errors and 5xx for GET/HEAD/PUT/DELETE/OPTIONS
+  read_only   like idempotent, but for APIs that search through POST
+
+Request bodies can be gzip-compressed with gzip=True for servers that
+accept Content-Encoding: gzip.
+
+Run `python3 http_client.py` to check connection reuse, retries,
+timeouts and gzip against a local test server.
+"""
+import atexit
+import gzip as gzip_lib
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+# Connections kept open per host; the manual review server checks previews from several threads
+POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+
+def _retry(**kwargs):
+    # Hand the last response back instead of raising, so callers keep using raise_for_status()
+    return Retry(backoff_factor=0.5, respect_retry_after_header=True, raise_on_status=False, **kwargs)
+
+
+RETRY_POLICIES = {
+    "none": lambda: Retry(total=0, read=False, redirect=5, raise_on_status=False),
+    "connect": lambda: _retry(total=3, connect=3, read=0, status=3, status_forcelist=(429,), allowed_methods=None),
+    "idempotent": lambda: _retry(total=3, connect=3, read=2, status=3, status_forcelist=RETRY_STATUSES,
+                                 allowed_methods=IDEMPOTENT_METHODS),
+    "read_only": lambda: _retry(total=3, connect=3, read=2, status=3, status_forcelist=RETRY_STATUSES,
+                                allowed_methods=IDEMPOTENT_METHODS | {"POST"}),
+}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(url, retry="idempotent"):
+    """The pooled session used for `url`'s host under the given retry policy."""
+    if retry not in RETRY_POLICIES:
+        raise ValueError(f"Unknown retry policy '{retry}' (choose from {', '.join(RETRY_POLICIES)})")
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc, retry)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=RETRY_POLICIES[retry]())
+            session.mount(f"{parts.scheme}://", adapter)
+            _sessions[key] = session
+        return session
+
+
+def request(method, url, retry="idempotent", timeout=DEFAULT_TIMEOUT, gzip=False, **kwargs):
+    """Send a request through the pooled session for `url`'s host.
+
+    Accepts the usual requests keyword arguments. With gzip=True a json=
+    or data= body is sent compressed.
+    """
+    if gzip:
+        body = kwargs.pop("data", None)
+        headers = dict(kwargs.pop("headers", None) or {})
+        if "json" in kwargs:
+            body = json.dumps(kwargs.pop("json")).encode("utf-8")
+            headers.setdefault("Content-Type", "application/json")
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if body is not None:
+            body = gzip_lib.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        kwargs["data"] = body
+        kwargs["headers"] = headers
+    return get_session(url, retry).request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def close_all():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+atexit.register(close_all)
+
+
+def _self_check():
+    """Exercise the client against a local keep-alive server and report what it saw."""
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    seen = {"connections": set(), "flaky": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, status, body=b"ok"):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            seen["connections"].add(self.client_address[1])
+            if self.path == "/flaky":
+                seen["flaky"] += 1
+                return self._reply(503 if seen["flaky"] < 3 else 200)
+            if self.path == "/slow":
+                time.sleep(1)
+            self._reply(200)
+
+        def do_POST(self):
+            seen["connections"].add(self.client_address[1])
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Encoding") == "gzip":
+                body = gzip_lib.decompress(body)
+            self._reply(200, body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    failures = []
+
+    def check(name, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        for _ in range(20):
+            get(f"{base}/").raise_for_status()
+        check(f"20 GETs over {len(seen['connections'])} connection(s)", len(seen["connections"]) == 1)
+
+        payload = {"contacts": ["x" * 100] * 50}
+        response = post(f"{base}/echo", json=payload, gzip=True)
+        check("gzip POST body round-trips", response.json() == payload)
+        check("POST reuses the same connection", len(seen["connections"]) == 1)
+
+        response = get(f"{base}/flaky")
+        check(f"503s retried ({seen['flaky']} attempts, final {response.status_code})",
+              response.status_code == 200 and seen["flaky"] == 3)
+
+        try:
+            get(f"{base}/slow", timeout=(1, 0.2), retry="none")
+            check("read timeout enforced", False)
+        except requests.Timeout:
+            check("read timeout enforced", True)
+    finally:
+        server.shutdown()
+        close_all()
+    return not failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if _self_check() else 1)
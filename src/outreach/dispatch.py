@@ -0,0 +1,208 @@
+"""
+Concurrent outreach dispatch engine.
+
+Messages are grouped by recipient. Each recipient's messages are sent in
+order (Text 1 before Text 2) by a single worker, while different recipients
+are handled concurrently. All workers share one rate limiter, and every
+delivered message is appended to a durable sent-ledger so a restarted run
+skips what already went out.
+
+The actual delivery goes through a `Transport`. `send_imessages.py` provides
+the AppleScript/Messages.app implementation; `FakeTransport` here simulates
+delivery latency so throughput can be measured on any machine.
+"""
+import abc
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class OutboundMessage:
+    recipient: str
+    seq: int  # 1 for "Text 1", 2 for "Text 2", ...
+    text: str
+    name: str = ""
+
+    @property
+    def key(self) -> str:
+        """Stable identity of this message, used by the sent-ledger."""
+        raw = f"{self.recipient}\x1f{self.seq}\x1f{self.text}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Transport(abc.ABC):
+    """Something that can deliver a text to a recipient."""
+
+    @abc.abstractmethod
+    def send(self, recipient: str, text: str) -> None:
+        """Deliver one message. Raise on failure. Called from several worker threads."""
+
+    def close(self) -> None:
+        """Release whatever the transport holds open (processes, connections)."""
+
+
+class FakeTransport(Transport):
+    """Local stand-in for Messages.app that records what it was asked to send."""
+
+    def __init__(self, latency: float = 0.3, jitter: float = 0.1, failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.sent: List[Tuple[float, str, str]] = []
+        self._lock = threading.Lock()
+
+    def send(self, recipient: str, text: str) -> None:
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError(f"fake delivery failure for {recipient}")
+        with self._lock:
+            self.sent.append((time.monotonic(), recipient, text))
+
+
+class RateLimiter:
+    """Token bucket shared by all workers: at most `rate` sends per second."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SentLedger:
+    """Append-only JSONL record of delivered messages, fsynced per entry."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._sent: Set[str] = set()
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self._sent.add(json.loads(line)["key"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue  # partially written last line after a crash
+        except FileNotFoundError:
+            pass
+
+    def __len__(self) -> int:
+        return len(self._sent)
+
+    def is_sent(self, message: OutboundMessage) -> bool:
+        return message.key in self._sent
+
+    def record(self, message: OutboundMessage) -> None:
+        entry = {
+            "key": message.key,
+            "recipient": message.recipient,
+            "seq": message.seq,
+            "name": message.name,
+            "sent_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        }
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._sent.add(message.key)
+
+
+@dataclass
+class DispatchStats:
+    sent: int = 0
+    skipped: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    failures: List[Tuple[str, int, str]] = field(default_factory=list)
+
+    @property
+    def throughput(self) -> float:
+        """Messages delivered per minute."""
+        return self.sent / self.elapsed * 60 if self.elapsed else 0.0
+
+
+class DispatchEngine:
+    """Sends messages concurrently across recipients, in order per recipient."""
+
+    def __init__(
+        self,
+        transport: Transport,
+        ledger: SentLedger,
+        rate_limiter: Optional[RateLimiter] = None,
+        workers: int = 4,
+        recipient_gap: float = 0.0,
+    ):
+        self.transport = transport
+        self.ledger = ledger
+        self.rate_limiter = rate_limiter or RateLimiter(0)
+        self.workers = workers
+        self.recipient_gap = recipient_gap  # pause between two texts to the same person
+        self._stats = DispatchStats()
+        self._lock = threading.Lock()
+
+    def dispatch(self, messages: Iterable[OutboundMessage]) -> DispatchStats:
+        by_recipient: Dict[str, List[OutboundMessage]] = {}
+        for message in messages:
+            by_recipient.setdefault(message.recipient, []).append(message)
+
+        self._stats = DispatchStats()
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [
+                executor.submit(self._send_in_order, sorted(queue, key=lambda m: m.seq))
+                for queue in by_recipient.values()
+            ]
+            for future in futures:
+                future.result()  # surface ledger/IO errors instead of dropping them
+        self._stats.elapsed = time.monotonic() - start
+        return self._stats
+
+    def _send_in_order(self, queue: List[OutboundMessage]) -> None:
+        sent_any = False
+        for message in queue:
+            if self.ledger.is_sent(message):
+                self._count("skipped")
+                continue
+            if sent_any and self.recipient_gap:
+                time.sleep(self.recipient_gap)
+            self.rate_limiter.acquire()
+            try:
+                self.transport.send(message.recipient, message.text)
+            except Exception as e:
+                print(f"ERROR: Text {message.seq} to {message.recipient} failed: {e}")
+                with self._lock:
+                    self._stats.failed += 1
+                    self._stats.failures.append((message.recipient, message.seq, str(e)))
+                # Do not send later texts out of order; a rerun will retry from here
+                return
+            self.ledger.record(message)
+            sent_any = True
+            self._count("sent")
+            print(f"DEBUG:  • Text {message.seq} → {message.name or message.recipient}")
+
+    def _count(self, attr: str) -> None:
+        with self._lock:
+            setattr(self._stats, attr, getattr(self._stats, attr) + 1)
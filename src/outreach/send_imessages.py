@@ -12,16 +12,22 @@ Before running, set the following environment variables or edit the constants:
   SPREADSHEET_ID           – Google Sheet ID
   SHEET_NAME               – Sheet tab name (default: Sheet1)
 
-Run with:  python3 send_imessages.py
+Run with:  python3 send_imessages.py [--workers 4] [--rate 0.5]
+Throughput test on any OS (no Sheet, no Messages.app):
+           python3 send_imessages.py --fake 2000
 """
+import argparse
+import json
 import os
-import time
+import select
 import subprocess
+import tempfile
+import threading
 from pathlib import Path
-from typing import List
+from typing import Iterable, List, Optional
 
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+from dispatch import DispatchEngine, FakeTransport, OutboundMessage, RateLimiter, SentLedger, Transport
+from sheet_reader import SheetReader
 
 # ---------- Configuration ---------- #
 GOOGLE_CREDENTIALS_JSON = os.getenv(
@@ -30,77 +36,229 @@ GOOGLE_CREDENTIALS_JSON = os.getenv(
 )
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID", "")  # <-- fill in if not using env var
 SHEET_NAME = os.getenv("SHEET_NAME", "Sheet1")
-SEND_DELAY = 2  # seconds between consecutive messages
+SEND_RATE = float(os.getenv("SEND_RATE", "0.5"))  # messages per second, across all recipients
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "4"))  # recipients handled concurrently
+RECIPIENT_GAP = 2  # seconds between Text 1 and Text 2 to the same person
+SENT_LEDGER = os.getenv("SENT_LEDGER", str(Path(__file__).with_name("sent_ledger.jsonl")))
+SHEET_CURSOR_FILE = os.getenv("SHEET_CURSOR_FILE", str(Path(__file__).with_name("sheet_cursor.json")))
+SHEETS_API_ENDPOINT = os.getenv("SHEETS_API_ENDPOINT", "")
 # ----------------------------------- #
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
 
 
+_sheets_service = None
+
+
+def get_sheets_service():
+    """Build the Sheets API client once per process."""
+    global _sheets_service
+    if _sheets_service is None:
+        from google.oauth2.service_account import Credentials
+        from googleapiclient.discovery import build
+
+        creds = Credentials.from_service_account_file(GOOGLE_CREDENTIALS_JSON, scopes=SCOPES)
+        # SHEETS_API_ENDPOINT points the client at another server, e.g. a local fake
+        client_options = {"api_endpoint": SHEETS_API_ENDPOINT} if SHEETS_API_ENDPOINT else None
+        _sheets_service = build("sheets", "v4", credentials=creds, client_options=client_options)
+    return _sheets_service
+
+
+def get_sheet_reader(cursor_file: Optional[str] = SHEET_CURSOR_FILE) -> SheetReader:
+    return SheetReader(get_sheets_service(), SPREADSHEET_ID, SHEET_NAME, cursor_file=cursor_file)
+
+
 def load_sheet_rows() -> List[List[str]]:
-    """Fetch all rows from the Google Sheet (excluding header)."""
-    creds = Credentials.from_service_account_file(GOOGLE_CREDENTIALS_JSON, scopes=SCOPES)
-    service = build("sheets", "v4", credentials=creds)
-    rng = f"{SHEET_NAME}!A1:D"
-    result = (
-        service.spreadsheets()
-        .values()
-        .get(spreadsheetId=SPREADSHEET_ID, range=rng)
-        .execute()
-    )
-    values = result.get("values", [])
-    if not values:
+    """Fetch all rows from the Google Sheet (excluding header), ignoring the cursor."""
+    rows = [row for _, row in get_sheet_reader(cursor_file=None).read_new()]
+    if not rows:
         print("No data found in sheet.")
-        return []
-    header, *rows = values
-    header = [h.strip() for h in header]
-    indices = {
-        key: header.index(key)
-        for key in ("Name", "Number", "Text 1", "Text 2")
-        if key in header
+    return rows
+
+
+class AppleScriptTransport(Transport):
+    """Send messages via Messages.app (iMessage) through long-lived osascript processes.
+
+    Starting osascript costs more than the send itself, so each worker thread
+    keeps one JavaScript-for-Automation process running and hands it one JSON
+    line per message on stdin; it answers with one JSON line on stdout.
+    """
+
+    # The recipient and text arrive as JSON data, never as script source, so
+    # quotes and backslashes in a text cannot break it.
+    SCRIPT = """
+    ObjC.import('Foundation');
+    function run() {
+      var Messages = Application('Messages');
+      var service = Messages.services.whose({serviceType: 'iMessage'})[0];
+      var stdin = $.NSFileHandle.fileHandleWithStandardInput;
+      var stdout = $.NSFileHandle.fileHandleWithStandardOutput;
+      var buffer = '';
+      while (true) {
+        var data = stdin.availableData;
+        if (data.length === 0) return;  // stdin closed: the transport is done
+        buffer += $.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding).js;
+        var newline;
+        while ((newline = buffer.indexOf('\\n')) >= 0) {
+          var line = buffer.slice(0, newline);
+          buffer = buffer.slice(newline + 1);
+          var reply;
+          try {
+            var message = JSON.parse(line);
+            Messages.send(message.text, {to: service.buddies.byName(message.recipient)});
+            reply = {ok: true};
+          } catch (e) {
+            reply = {ok: false, error: String(e)};
+          }
+          stdout.writeData($(JSON.stringify(reply) + '\\n').dataUsingEncoding($.NSUTF8StringEncoding));
+        }
+      }
     }
-    processed = []
-    for row in rows:
-        try:
-            processed.append(
-                [row[indices["Name"]], row[indices["Number"]], row[indices["Text 1"]], row[indices["Text 2"]]]
+    """
+
+    def __init__(self, timeout: float = 30, command: Optional[List[str]] = None):
+        self.timeout = timeout
+        self.command = command or ["osascript", "-l", "JavaScript", "-e", self.SCRIPT]
+        self._local = threading.local()
+        self._processes: List[subprocess.Popen] = []
+        self._lock = threading.Lock()
+
+    def _process(self) -> subprocess.Popen:
+        process = getattr(self._local, "process", None)
+        if process is None or process.poll() is not None:
+            process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,
             )
-        except Exception:
-            continue  # skip malformed rows
-    return processed
+            self._local.process = process
+            with self._lock:
+                self._processes.append(process)
+        return process
+
+    def _discard(self, process: subprocess.Popen) -> None:
+        process.kill()
+        process.wait()
+        self._local.process = None
+
+    def send(self, recipient: str, text: str) -> None:
+        process = self._process()
+        try:
+            process.stdin.write(json.dumps({"recipient": recipient, "text": text}) + "\n")
+            process.stdin.flush()
+        except OSError as e:
+            self._discard(process)
+            raise RuntimeError(f"osascript exited: {e}")
+        ready, _, _ = select.select([process.stdout], [], [], self.timeout)
+        reply = process.stdout.readline() if ready else ""
+        if not reply:
+            # Hung or crashed: start a fresh process for the next message
+            self._discard(process)
+            raise RuntimeError("osascript did not answer" if not ready else "osascript exited")
+        result = json.loads(reply)
+        if not result.get("ok"):
+            raise RuntimeError(result.get("error") or "send failed")
+
+    def close(self) -> None:
+        with self._lock:
+            processes, self._processes = self._processes, []
+        for process in processes:
+            if process.poll() is None:
+                process.stdin.close()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
 
 
 def send_imessage(recipient: str, text: str):
     """Send a single message via AppleScript (iMessage)."""
-    script = f'''
-    tell application "Messages"
-        set targetService to 1st service whose service type = iMessage
-        set targetBuddy to buddy "{recipient}" of targetService
-        send "{text}" to targetBuddy
-    end tell
-    '''
-    subprocess.run(["osascript", "-e", script], check=False)
+    transport = AppleScriptTransport()
+    try:
+        transport.send(recipient, text)
+    finally:
+        transport.close()
 
 
-def main():
-    if not SPREADSHEET_ID:
-        raise SystemExit("FATAL: SPREADSHEET_ID env var not set and constant left blank.")
-    creds_file_exists = Path(GOOGLE_CREDENTIALS_JSON).expanduser().exists()
-    if not creds_file_exists:
-        raise SystemExit(f"FATAL: credentials file not found: {GOOGLE_CREDENTIALS_JSON}")
-
-    print("DEBUG: Fetching rows from Google Sheet…")
-    rows = load_sheet_rows()
-    print(f"DEBUG: Loaded {len(rows)} rows")
-
+def build_messages(rows: Iterable[List[str]]) -> List[OutboundMessage]:
+    messages = []
     for name, number, text1, text2 in rows:
-        print(f"DEBUG: Sending messages to {name} – {number}")
         for idx, msg in enumerate((text1, text2), 1):
             if msg:
-                print(f"DEBUG:  • Text {idx}")
-                send_imessage(number, msg)
-                time.sleep(SEND_DELAY)
-    print("DEBUG: All messages sent ✉️")
+                messages.append(OutboundMessage(recipient=number, seq=idx, text=msg, name=name))
+    return messages
+
+
+def fake_rows(count: int) -> List[List[str]]:
+    return [[f"Contact {i}", f"+1555{i:07d}", f"Hi Contact {i}!", "Following up."] for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send the texts in the outreach Google Sheet via iMessage")
+    parser.add_argument("--workers", type=int, default=SEND_WORKERS, help="recipients handled concurrently")
+    parser.add_argument("--rate", type=float, default=SEND_RATE, help="max messages per second (0 = unlimited)")
+    parser.add_argument("--ledger", default=SENT_LEDGER, help="sent-ledger file used to skip delivered messages")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the sheet cursor and re-read every row (the sent-ledger still skips duplicates)")
+    parser.add_argument("--fake", type=int, metavar="ROWS",
+                        help="send ROWS synthetic rows through the fake transport to measure throughput")
+    args = parser.parse_args()
+
+    reader = None
+    if args.fake:
+        rows = fake_rows(args.fake)
+        transport: Transport = FakeTransport()
+        if args.ledger == SENT_LEDGER:
+            # A fresh ledger per fake run, so repeated benchmarks do not skip everything
+            fake_dir = tempfile.TemporaryDirectory(prefix="imessage_fake_")
+            ledger_path = os.path.join(fake_dir.name, "sent_ledger.jsonl")
+        else:
+            ledger_path = args.ledger
+    else:
+        if not SPREADSHEET_ID:
+            raise SystemExit("FATAL: SPREADSHEET_ID env var not set and constant left blank.")
+        creds_file_exists = Path(GOOGLE_CREDENTIALS_JSON).expanduser().exists()
+        if not creds_file_exists:
+            raise SystemExit(f"FATAL: credentials file not found: {GOOGLE_CREDENTIALS_JSON}")
+
+        reader = get_sheet_reader()
+        if args.full:
+            reader.reset()
+        print(f"DEBUG: Fetching new rows from Google Sheet (from row {reader.state['next_row']})…")
+        rows = [row for _, row in reader.read_new()]
+        transport = AppleScriptTransport()
+        ledger_path = args.ledger
+    print(f"DEBUG: Loaded {len(rows)} rows")
+
+    ledger = SentLedger(ledger_path)
+    print(f"DEBUG: {len(ledger)} messages already in sent-ledger {ledger_path}")
+    engine = DispatchEngine(
+        transport,
+        ledger,
+        rate_limiter=RateLimiter(args.rate),
+        workers=args.workers,
+        recipient_gap=0 if args.fake else RECIPIENT_GAP,
+    )
+    try:
+        stats = engine.dispatch(build_messages(rows))
+    finally:
+        transport.close()
+    print(
+        f"DEBUG: Sent {stats.sent}, skipped {stats.skipped} already sent, {stats.failed} failed "
+        f"in {stats.elapsed:.1f}s ({stats.throughput:.0f} msg/min)"
+    )
+    if stats.failed:
+        # Leave the cursor where it was so the next run re-reads these rows
+        print("DEBUG: Re-run to retry failed recipients; delivered messages will be skipped.")
+    else:
+        if reader is not None:
+            reader.commit()
+        print("DEBUG: All messages sent ✉️")
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
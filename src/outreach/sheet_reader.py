@@ -0,0 +1,255 @@
+"""
+Incremental reader for the outreach Google Sheet.
+
+Keeps a persisted row cursor so each run only downloads rows appended since
+the previous run. New rows are fetched in fixed-size windows, several
+windows per `values.batchGet` call. Row 1 rides along in the first
+batchGet of every read: the header → column mapping is cached alongside
+the cursor and re-derived whenever the header has changed, so reordered
+or inserted columns never shift values into the wrong fields.
+
+Run `python3 sheet_reader.py` to check the reader against a local fake
+Sheets values endpoint (the same one SHEETS_API_ENDPOINT can point at).
+"""
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_COLUMNS = ("Name", "Number", "Text 1", "Text 2")
+
+
+class SheetReader:
+    def __init__(
+        self,
+        service,
+        spreadsheet_id: str,
+        sheet_name: str,
+        cursor_file: Optional[str] = None,
+        columns: Sequence[str] = DEFAULT_COLUMNS,
+        last_column: str = "D",
+        window_rows: int = 500,
+        windows_per_batch: int = 4,
+    ):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_name = sheet_name
+        self.cursor_file = cursor_file
+        self.columns = tuple(columns)
+        self.last_column = last_column
+        self.window_rows = window_rows
+        self.windows_per_batch = windows_per_batch
+        self.state = self._load_state()
+        self._pending_next_row: Optional[int] = None
+
+    # ---------- cursor persistence ---------- #
+
+    def _fresh_state(self) -> Dict:
+        return {
+            "spreadsheet_id": self.spreadsheet_id,
+            "sheet_name": self.sheet_name,
+            "next_row": 2,  # row 1 is the header
+            "header": None,
+            "indices": None,
+        }
+
+    def _load_state(self) -> Dict:
+        if not self.cursor_file:
+            return self._fresh_state()
+        try:
+            with open(self.cursor_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return self._fresh_state()
+        # A cursor for another sheet (or another column set) does not apply here
+        if (
+            state.get("spreadsheet_id") != self.spreadsheet_id
+            or state.get("sheet_name") != self.sheet_name
+            or set((state.get("indices") or {}).keys()) != set(self.columns)
+        ):
+            return self._fresh_state()
+        return state
+
+    def _save_state(self) -> None:
+        if not self.cursor_file:
+            return
+        tmp = self.cursor_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.cursor_file)
+
+    def reset(self) -> None:
+        """Forget the cursor and cached header; the next read starts from row 2."""
+        self.state = self._fresh_state()
+        self._save_state()
+
+    def commit(self) -> None:
+        """Persist the cursor past the rows returned by the last read_new()."""
+        if self._pending_next_row is not None:
+            self.state["next_row"] = self._pending_next_row
+            self._pending_next_row = None
+        self._save_state()
+
+    # ---------- reading ---------- #
+
+    def _a1(self, first_row: int, last_row: int) -> str:
+        return f"{self.sheet_name}!A{first_row}:{self.last_column}{last_row}"
+
+    def _header_indices(self, values: List[List[str]]) -> Dict[str, int]:
+        """Column indices from row 1, re-derived only when the header differs from the cached one."""
+        header = [h.strip() for h in values[0]] if values else []
+        if header != self.state.get("header") or self.state.get("indices") is None:
+            missing = [key for key in self.columns if key not in header]
+            if missing:
+                raise ValueError(f"Sheet header is missing columns: {', '.join(missing)}")
+            if self.state.get("header") is not None:
+                print(f"Sheet header changed from {self.state['header']} to {header}; remapping columns")
+            self.state["header"] = header
+            self.state["indices"] = {key: header.index(key) for key in self.columns}
+            self._save_state()
+        return self.state["indices"]
+
+    def read_new(self) -> List[Tuple[int, List[str]]]:
+        """Return (sheet row number, [values in `columns` order]) for rows past the cursor.
+
+        The cursor is not moved until commit() is called, so a crash between
+        reading and handling the rows re-reads them on the next run.
+        """
+        indices = None
+        next_row = self.state["next_row"]
+        rows: List[Tuple[int, List[str]]] = []
+        while True:
+            starts = [next_row + i * self.window_rows for i in range(self.windows_per_batch)]
+            ranges = [self._a1(start, start + self.window_rows - 1) for start in starts]
+            if indices is None:
+                # The header is checked in the same call as the first windows
+                ranges.insert(0, self._a1(1, 1))
+            result = (
+                self.service.spreadsheets()
+                .values()
+                .batchGet(spreadsheetId=self.spreadsheet_id, ranges=ranges, majorDimension="ROWS")
+                .execute()
+            )
+            value_ranges = result.get("valueRanges", [])
+            if indices is None:
+                indices = self._header_indices(value_ranges[0].get("values", []) if value_ranges else [])
+                value_ranges = value_ranges[1:]
+            exhausted = not value_ranges
+            for start, value_range in zip(starts, value_ranges):
+                values = value_range.get("values", [])
+                for offset, row in enumerate(values):
+                    picked = [row[indices[key]].strip() if indices[key] < len(row) else "" for key in self.columns]
+                    if any(picked):
+                        rows.append((start + offset, picked))
+                # Sheets trims trailing empty rows, so a short window is the end of the data
+                if len(values) < self.window_rows:
+                    next_row = start + len(values)
+                    exhausted = True
+                    break
+            if exhausted:
+                break
+            next_row = starts[-1] + self.window_rows
+
+        self._pending_next_row = next_row
+        return rows
+
+
+def _fake_sheets_server(sheet):
+    """Local Sheets `values:batchGet` endpoint serving `sheet` (a list of rows, header first).
+
+    Returns (server, calls); `sheet` can be edited while the server runs.
+    """
+    import re
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlsplit
+
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if not url.path.endswith("/values:batchGet"):
+                body = json.dumps({"error": {"code": 404, "message": "not found"}}).encode("utf-8")
+                status = 404
+            else:
+                ranges = parse_qs(url.query).get("ranges", [])
+                calls.append(ranges)
+                value_ranges = []
+                for a1 in ranges:
+                    match = re.match(r"(.+)!A(\d+):[A-Z]+(\d+)$", a1)
+                    first, last = int(match.group(2)), int(match.group(3))
+                    values = [list(row) for row in sheet[first - 1:last]]
+                    while values and not any(values[-1]):
+                        values.pop()  # Sheets trims trailing empty rows
+                    value_range = {"range": a1, "majorDimension": "ROWS"}
+                    if values:
+                        value_range["values"] = values
+                    value_ranges.append(value_range)
+                body = json.dumps({"spreadsheetId": "fake", "valueRanges": value_ranges}).encode("utf-8")
+                status = 200
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, calls
+
+
+def _self_check() -> bool:
+    """Read, resume, append and reorder columns against the fake endpoint."""
+    import tempfile
+    from googleapiclient.discovery import build
+
+    sheet = [["Name", "Number", "Text 1", "Text 2"]]
+    sheet += [[f"Name {i}", f"+1555{i:07d}", f"Hi {i}", f"Bye {i}"] for i in range(1, 1201)]
+    server, calls = _fake_sheets_server(sheet)
+    service = build("sheets", "v4", developerKey="fake", static_discovery=True,
+                    client_options={"api_endpoint": f"http://127.0.0.1:{server.server_port}"})
+    failures = []
+
+    def check(name, ok):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            cursor = os.path.join(tmp, "cursor.json")
+            reader = SheetReader(service, "fake", "Sheet1", cursor_file=cursor, window_rows=100, windows_per_batch=4)
+            rows = reader.read_new()
+            reader.commit()
+            check(f"1200 rows in {len(calls)} batchGet calls", len(rows) == 1200 and len(calls) == 4)
+            check("row numbers and values line up", rows[0] == (2, ["Name 1", "+15550000001", "Hi 1", "Bye 1"]))
+
+            sheet.append(["Name 1201", "+15550001201", "Hi 1201", "Bye 1201"])
+            reader = SheetReader(service, "fake", "Sheet1", cursor_file=cursor, window_rows=100, windows_per_batch=4)
+            del calls[:]
+            rows = reader.read_new()
+            reader.commit()
+            check("a new run reads only the appended row, in one call",
+                  [r[0] for r in rows] == [1202] and len(calls) == 1)
+
+            # Someone inserts a column and moves Number to the end
+            for i, row in enumerate(sheet):
+                sheet[i] = [row[0], "Notes" if i == 0 else "", row[2], row[3], row[1]]
+            sheet.append(["Name 1202", "", "Hi 1202", "Bye 1202", "+15550001202"])
+            reader.last_column = "E"
+            rows = reader.read_new()
+            check("reordered columns are remapped from the new header",
+                  rows == [(1203, ["Name 1202", "+15550001202", "Hi 1202", "Bye 1202"])])
+    finally:
+        server.shutdown()
+    return not failures
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if _self_check() else 1)